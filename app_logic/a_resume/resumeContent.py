@@ -0,0 +1,74 @@
+# logic/a_resume/resumeContent.py - Keeps extracted resume text in one memory-mapped SQLite database
+import os
+import sqlite3
+import logging
+import threading
+from typing import Optional
+logger = logging.getLogger(__name__)
+# === Storage Paths ===
+RESUME_DIR = os.path.join(os.path.dirname(__file__), '../../static/resumes')
+RESUME_CONTENT_DB = os.path.join(RESUME_DIR, 'resumes.db')
+# Per-resume text files written by earlier versions; folded into the database on startup
+LEGACY_CONTENT_SUFFIX = '_content.txt'
+MMAP_SIZE = 256 * 1024 * 1024
+# === Resume Content Store ===
+# """id -> extracted text table in SQLite; reads go through the mmap instead of one open/read/close per file"""
+class ResumeContentStore:
+    def __init__(self):
+        os.makedirs(RESUME_DIR, exist_ok=True)
+        self._lock = threading.Lock()
+        # One connection shared by the worker's threads; the lock serializes access to it
+        self._conn = sqlite3.connect(RESUME_CONTENT_DB, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(f"PRAGMA mmap_size={MMAP_SIZE}")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS contents (id TEXT PRIMARY KEY, body TEXT NOT NULL)")
+        self._migrate_legacy_files()
+    # """Import and remove any {id}_content.txt files left by the file-per-resume layout"""
+    def _migrate_legacy_files(self):
+        try:
+            legacy = [entry for entry in os.scandir(RESUME_DIR) if entry.name.endswith(LEGACY_CONTENT_SUFFIX) and entry.is_file()]
+        except FileNotFoundError:
+            return
+        if not legacy:
+            return
+        rows = []
+        for entry in legacy:
+            try:
+                with open(entry.path, 'r', encoding='utf-8') as f:
+                    rows.append((entry.name[:-len(LEGACY_CONTENT_SUFFIX)], f.read()))
+            except Exception as e:
+                logger.error(f"[resume_content] Failed to read {entry.name}: {e}")
+        try:
+            with self._lock:
+                self._conn.execute("BEGIN")
+                self._conn.executemany("INSERT OR REPLACE INTO contents (id, body) VALUES (?, ?)", rows)
+                self._conn.execute("COMMIT")
+        except Exception as e:
+            logger.error(f"[resume_content] Failed to migrate legacy content files: {e}")
+            with self._lock:
+                if self._conn.in_transaction:
+                    self._conn.execute("ROLLBACK")
+            return
+        # Text files are only removed once their rows are committed
+        for resume_id, _ in rows:
+            try:
+                os.remove(os.path.join(RESUME_DIR, resume_id + LEGACY_CONTENT_SUFFIX))
+            except FileNotFoundError:
+                pass
+        logger.info(f"[resume_content] Migrated {len(rows)} legacy content files into {os.path.basename(RESUME_CONTENT_DB)}")
+    # """Return the stored text for a resume, or None when it has none"""
+    def get(self, resume_id: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute("SELECT body FROM contents WHERE id = ?", (resume_id,)).fetchone()
+        return row[0] if row else None
+    # """Insert or replace the text for a resume"""
+    def put(self, resume_id: str, content: str) -> None:
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO contents (id, body) VALUES (?, ?)", (resume_id, content))
+    # """Remove a resume's text; returns True if a row was deleted"""
+    def delete(self, resume_id: str) -> bool:
+        with self._lock:
+            return self._conn.execute("DELETE FROM contents WHERE id = ?", (resume_id,)).rowcount > 0
+# === Singleton Instance ===
+resume_content_store = ResumeContentStore()
@@ -2,16 +2,32 @@
 import os
 import json
 import uuid
+import errno
+import atexit
 import logging
 import shutil
+from bisect import insort
+from collections import defaultdict
+from contextlib import contextmanager
 from datetime import datetime
+from functools import lru_cache
+import numpy as np
+try:
+    import fcntl
+except ImportError:  # Windows development machines; deployments are POSIX
+    fcntl = None
 from flask import Blueprint, redirect, url_for, flash, request, jsonify, session
 from typing import Optional, List, Dict
+from app_logic.a_resume.resumeContent import resume_content_store
+from app_logic.b_jobs.jobBatches import dumps_json, read_json
 # === Setup ===
 logger = logging.getLogger(__name__)
 resume_history_bp = Blueprint("resume_history", __name__)
 # === Template Filters ===
-def datetimeformat(value, format='%B %d, %Y'):
+# Display format for upload dates; also stored pre-formatted as upload_date_formatted
+UPLOAD_DATE_FORMAT = '%B %d, %Y'
+@lru_cache(maxsize=1024)
+def datetimeformat(value, format=UPLOAD_DATE_FORMAT):
     try:
         return datetime.fromisoformat(value).strftime(format)
     except Exception:
@@ -20,14 +36,32 @@ resume_history_bp.add_app_template_filter(datetimeformat, name='datetimeformat')
 # === Storage Paths ===
 RESUME_DIR = os.path.join(os.path.dirname(__file__), '../../static/resumes')
 RESUME_INDEX_FILE = os.path.join(RESUME_DIR, 'index.json')
+# Changes since the last index.json snapshot, one JSON object per line
+RESUME_INDEX_LOG = os.path.join(RESUME_DIR, 'index.log')
+# flock'd by every process that appends to, compacts or reloads the index
+RESUME_INDEX_LOCK_FILE = os.path.join(RESUME_DIR, 'index.lock')
+INDEX_COMPACT_EVERY = 500
+# === Cross-Process Locking ===
+# """Exclusive flock on the index lock file; keeps a compaction from truncating entries other workers just appended"""
+@contextmanager
+def _index_file_lock():
+    if fcntl is None:
+        yield
+        return
+    os.makedirs(RESUME_DIR, exist_ok=True)
+    with open(RESUME_INDEX_LOCK_FILE, 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
 # === Resume Access and Deletion ===
 # """Load the resume index from file"""
 def _load_index() -> Dict:
     try:
         if not os.path.exists(RESUME_INDEX_FILE):
             return {"resumes": {}, "count": 0, "last_added": None}
-        with open(RESUME_INDEX_FILE, 'r', encoding='utf-8') as f:
-            index = json.load(f)
+        index = read_json(RESUME_INDEX_FILE)
         index.setdefault("resumes", {})
         index.setdefault("count", len(index["resumes"]))
         index.setdefault("last_added", None)
@@ -40,80 +74,112 @@ def _save_index(index: Dict = None):
     try:
         if index is None:
             index = resume_storage._index
-        with open(RESUME_INDEX_FILE, 'w', encoding='utf-8') as f:
-            json.dump(index, f, indent=2)
+        data = dumps_json(index)
+        # Write beside the index and rename over it so a crash never leaves a torn index.json
+        tmp_path = RESUME_INDEX_FILE + ".tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, RESUME_INDEX_FILE)
     except Exception as e:
         logger.error(f"Error saving resume index: {str(e)}")
+# """Apply logged index changes on top of a snapshot and return how many were applied"""
+def _replay_index_log(index: Dict) -> int:
+    applied = 0
+    try:
+        if not os.path.exists(RESUME_INDEX_LOG):
+            return 0
+        with open(RESUME_INDEX_LOG, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    logger.warning("Skipping torn resume index log entry")
+                    continue
+                if entry["op"] == "put":
+                    index["resumes"][entry["id"]] = entry["meta"]
+                elif entry["op"] == "del":
+                    index["resumes"].pop(entry["id"], None)
+                index["count"] = entry["count"]
+                index["last_added"] = entry["last_added"]
+                applied += 1
+    except Exception as e:
+        logger.error(f"Error replaying resume index log: {str(e)}")
+    return applied
 # === Resume Access ===
 # Get all stored resumes, sorted by upload date
 def get_all_resumes(user_id: Optional[str] = None) -> List[Dict]:
     try:
-        index = _load_index()
-        resumes = list(index["resumes"].values())
-        if user_id:
-            resumes = [r for r in resumes if r.get("user_id") == user_id]
-        resumes.sort(key=lambda r: r.get("upload_date", ""), reverse=True)
-        return resumes
+        return resume_storage.resumes_by_date(user_id)
     except Exception as e:
         logger.error(f"Error fetching all resumes: {str(e)}")
         return []
 # Get a specific resume's metadata
 def get_resume(resume_id: str) -> Optional[Dict]:
     try:
-        index = _load_index()
-        return index["resumes"].get(resume_id)
+        return resume_storage.current_index()["resumes"].get(resume_id)
     except Exception as e:
         logger.error(f"Error getting resume {resume_id}: {str(e)}")
         return None
 # Get the content of a resume
 def get_resume_content(resume_id: str) -> Optional[str]:
     try:
-        content_path = os.path.join(RESUME_DIR, f"{resume_id}_content.txt")
-        if not os.path.exists(content_path):
-            logger.warning(f"Content file for resume {resume_id} not found")
-            return None
-        with open(content_path, 'r', encoding='utf-8') as f:
-            return f.read()
+        content = resume_content_store.get(resume_id)
+        if content is None:
+            logger.warning(f"Content for resume {resume_id} not found")
+        return content
     except Exception as e:
         logger.error(f"Error reading resume content for {resume_id}: {str(e)}")
         return None
+# Get a resume's stored embeddings from its float32 sidecar file
+def get_resume_embeddings(resume_id: str) -> Optional[Dict[str, np.ndarray]]:
+    try:
+        embeddings_path = os.path.join(RESUME_DIR, f"{resume_id}_embeddings.npy")
+        if not os.path.exists(embeddings_path):
+            return None
+        stacked = np.load(embeddings_path)
+        return {"narrative": stacked[0], "skills": stacked[1]}
+    except Exception as e:
+        logger.error(f"Error reading resume embeddings for {resume_id}: {str(e)}")
+        return None
 # === Resume Deletion ===
 # Delete a resume
 def delete_resume(resume_id: str) -> bool:
     try:
-        index = resume_storage._index  # ✅ Use the singleton directly
+        # Reloaded under the index lock, so resumes stored by other workers are found too
+        with resume_storage._locked_update() as index:
+            if resume_id not in index["resumes"]:
+                logger.warning(f"Resume ID {resume_id} not found in index")
+                return False
 
-        if resume_id not in index["resumes"]:
-            logger.warning(f"Resume ID {resume_id} not found in index")
-            return False
+            metadata = index["resumes"][resume_id]
+            stored_filename = metadata.get("stored_filename")
 
-        metadata = index["resumes"][resume_id]
-        stored_filename = metadata.get("stored_filename")
-        content_filename = f"{resume_id}_content.txt"
+            # Delete the actual files
+            if stored_filename:
+                file_path = os.path.join(RESUME_DIR, stored_filename)
+                if os.path.exists(file_path):
+                    os.remove(file_path)
 
-        # Delete the actual files
-        if stored_filename:
-            file_path = os.path.join(RESUME_DIR, stored_filename)
-            if os.path.exists(file_path):
-                os.remove(file_path)
+            resume_content_store.delete(resume_id)
 
-        content_path = os.path.join(RESUME_DIR, content_filename)
-        if os.path.exists(content_path):
-            os.remove(content_path)
+            embeddings_path = os.path.join(RESUME_DIR, f"{resume_id}_embeddings.npy")
+            if os.path.exists(embeddings_path):
+                os.remove(embeddings_path)
 
-        # Update the in-memory index
-        del index["resumes"][resume_id]
-        index["count"] = max(0, len(index["resumes"]))  # Defensive
+            # Update the in-memory index
+            resume_storage._unindex_resume(resume_id, metadata)
+            del index["resumes"][resume_id]
+            index["count"] = max(0, len(index["resumes"]))  # Defensive
 
-        if index.get("last_added") == resume_id:
-            if index["resumes"]:
-                newest = max(index["resumes"].values(), key=lambda r: r.get("upload_date", ""))
-                index["last_added"] = newest["id"]
-            else:
-                index["last_added"] = None
+            if index.get("last_added") == resume_id:
+                if index["resumes"]:
+                    newest = max(index["resumes"].values(), key=lambda r: r.get("upload_date", ""))
+                    index["last_added"] = newest["id"]
+                else:
+                    index["last_added"] = None
 
-        # ✅ Save the updated in-memory state
-        resume_storage._save_index()
+            # ✅ Record the deletion in the index log
+            resume_storage._log_delete(resume_id)
 
         logger.info(f"Deleted resume ID {resume_id}")
         return True
@@ -165,42 +231,166 @@ def set_active_resume():
     except Exception as e:
         logger.error(f"Error setting active resume: {str(e)}")
         return jsonify({"success": False, "error": str(e)}), 500
+# """Move an upload into storage: a rename on the same filesystem, a kernel-side copy across filesystems"""
+def _move_upload(src: str, dst: str) -> None:
+    try:
+        os.replace(src, dst)
+        return
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+    # copyfile uses sendfile(2) on Linux; unlike copy2 it skips the stat/utime metadata copy
+    shutil.copyfile(src, dst)
+    os.remove(src)
 # === Resume Storage Class ===
 # """Initialize the storage object"""
 class ResumeStorage:
     def __init__(self):
         self._index = {}
+        self._index_mtime = None
+        self._log_entries = 0
+        # Secondary indexes: (upload_date, id) pairs kept sorted, overall and per user
+        self._by_date: List[tuple] = []
+        self._by_user: Dict[str, List[tuple]] = defaultdict(list)
         self._initialize_resume_index()
     # """Ensure resume directory and index file exist"""
     def _initialize_resume_index(self):
         os.makedirs(RESUME_DIR, exist_ok=True)
-        if not os.path.exists(RESUME_INDEX_FILE):
-            self._index = {"resumes": {}, "count": 0, "last_added": None}
-            self._save_index()
+        with _index_file_lock():
+            if not os.path.exists(RESUME_INDEX_FILE):
+                self._index = {"resumes": {}, "count": 0, "last_added": None}
+                self._rebuild_secondary_indexes()
+                self._save_index()
+            else:
+                self._load_index(locked=True)
+    # """Load resume index into memory; pass locked=True when the index lock is already held"""
+    def _load_index(self, locked: bool = False):
+        if locked:
+            self._read_index()
         else:
-            self._load_index()
-    # """Load resume index into memory"""
-    def _load_index(self):
-        try:
-            with open(RESUME_INDEX_FILE, 'r', encoding='utf-8') as f:
-                self._index = json.load(f)
-        except Exception as e:
-            logger.error(f"Error loading resume index: {str(e)}")
-            self._index = {"resumes": {}, "count": 0, "last_added": None}
-    # """Save resume index from memory to disk"""
+            with _index_file_lock():
+                self._read_index()
+    # """Read the snapshot and replay the change log (caller holds the index lock)"""
+    def _read_index(self):
+        self._index_mtime = self._stat_index()
+        self._index = _load_index()
+        self._log_entries = _replay_index_log(self._index)
+        self._rebuild_secondary_indexes()
+        if self._migrate_legacy_embeddings():
+            self._save_index()
+    # """Move embeddings kept as JSON lists in index records into .npy sidecars; returns how many records changed"""
+    def _migrate_legacy_embeddings(self) -> int:
+        migrated = 0
+        for resume_id, resume in self._index["resumes"].items():
+            holders = [h for h in (resume, resume.get("metadata") or {}) if "embedding_narrative" in h or "embedding_skills" in h]
+            if not holders:
+                continue
+            try:
+                # 768 boxed floats per record dominate the index's memory; the sidecar holds them as one array
+                narrative, skills = holders[0].get("embedding_narrative"), holders[0].get("embedding_skills")
+                if not resume.get("embedding_file") and isinstance(narrative, list) and isinstance(skills, list) and len(narrative) == len(skills) > 0:
+                    resume["embedding_file"] = self._write_embeddings(resume_id, {"narrative": narrative, "skills": skills})
+                for holder in holders:
+                    holder.pop("embedding_narrative", None)
+                    holder.pop("embedding_skills", None)
+                migrated += 1
+            except Exception as e:
+                logger.error(f"Error migrating embeddings for resume {resume_id}: {str(e)}")
+        if migrated:
+            logger.info(f"Moved list embeddings of {migrated} resumes into sidecar files")
+        return migrated
+    # """Rebuild the date-sorted and per-user resume lists from the index"""
+    def _rebuild_secondary_indexes(self):
+        self._by_date = []
+        self._by_user = defaultdict(list)
+        for resume_id, resume in self._index["resumes"].items():
+            self._index_resume(resume_id, resume)
+    # """Add one resume to the secondary indexes"""
+    def _index_resume(self, resume_id: str, resume: Dict):
+        entry = (resume.get("upload_date", ""), resume_id)
+        insort(self._by_date, entry)
+        if resume.get("user_id"):
+            insort(self._by_user[resume["user_id"]], entry)
+    # """Remove one resume from the secondary indexes"""
+    def _unindex_resume(self, resume_id: str, resume: Dict):
+        entry = (resume.get("upload_date", ""), resume_id)
+        for entries in (self._by_date, self._by_user.get(resume.get("user_id"), [])):
+            if entry in entries:
+                entries.remove(entry)
+    # """Resumes newest first, optionally limited to one user"""
+    def resumes_by_date(self, user_id: Optional[str] = None) -> List[Dict]:
+        resumes = self.current_index()["resumes"]
+        entries = self._by_user.get(user_id, []) if user_id else self._by_date
+        return [resumes[resume_id] for _, resume_id in reversed(entries)]
+    # """Write a full snapshot of the index and start a fresh change log (caller holds the index lock)"""
     def _save_index(self):
         _save_index(self._index)
+        open(RESUME_INDEX_LOG, 'w').close()
+        self._log_entries = 0
+        self._index_mtime = self._stat_index()
+    # """Lock the index and reload it, then yield it for one change plus its log entry; snapshot every INDEX_COMPACT_EVERY changes"""
+    @contextmanager
+    def _locked_update(self):
+        with _index_file_lock():
+            self._maybe_reload(locked=True)
+            yield self._index
+        # compact() takes the lock itself, so it runs once the update has released it
+        if self._log_entries >= INDEX_COMPACT_EVERY:
+            self.compact()
+    # """Append one change to the index log (caller is inside _locked_update)"""
+    def _append_log(self, entry: Dict):
+        try:
+            entry.update(count=self._index["count"], last_added=self._index["last_added"])
+            with open(RESUME_INDEX_LOG, 'ab') as f:
+                f.write(dumps_json(entry) + b"\n")
+                f.flush()
+                os.fsync(f.fileno())
+            self._log_entries += 1
+            # The index was reloaded under the lock, so this append is the only change since
+            self._index_mtime = self._stat_index()
+        except Exception as e:
+            logger.error(f"Error appending to resume index log: {str(e)}")
+    # """Log the current metadata of a stored or updated resume"""
+    def _log_put(self, resume_id: str):
+        self._append_log({"op": "put", "id": resume_id, "meta": self._index["resumes"][resume_id]})
+    # """Log the removal of a resume"""
+    def _log_delete(self, resume_id: str):
+        self._append_log({"op": "del", "id": resume_id})
+    # """Fold the change log into index.json; the lock spans reload, snapshot and truncation"""
+    def compact(self):
+        with _index_file_lock():
+            self._maybe_reload(locked=True)
+            if self._log_entries:
+                self._save_index()
+    # """Index snapshot mtime and change log size, or None when the snapshot does not exist"""
+    @staticmethod
+    def _stat_index() -> Optional[tuple]:
+        try:
+            log_size = os.path.getsize(RESUME_INDEX_LOG) if os.path.exists(RESUME_INDEX_LOG) else 0
+            return os.stat(RESUME_INDEX_FILE).st_mtime_ns, log_size
+        except OSError:
+            return None
+    # """Reload the index only if another process has rewritten the file"""
+    def _maybe_reload(self, locked: bool = False):
+        if self._stat_index() != self._index_mtime:
+            self._load_index(locked)
+    # """In-memory index, refreshed when the file changed on disk"""
+    def current_index(self) -> Dict:
+        self._maybe_reload()
+        return self._index
     # """Store a resume permanently and update index"""
-    def store_resume(self, temp_filepath: str, filename: str, content: str, metadata: Optional[Dict] = None, user_id: Optional[str] = None) -> str:
+    def store_resume(self, temp_filepath: Optional[str], filename: str, content: str, metadata: Optional[Dict] = None, user_id: Optional[str] = None, embeddings: Optional[Dict[str, np.ndarray]] = None, data: Optional[bytes] = None) -> str:
         try:
             resume_id = str(uuid.uuid4())
             if metadata is None:
                 metadata = {}
+            uploaded_at = datetime.now()
             resume_metadata = {
                 "id": resume_id,
                 "original_filename": filename,
                 "stored_filename": f"{resume_id}_{filename}",
-                "upload_date": datetime.now().isoformat(),
+                "upload_date": uploaded_at.isoformat(),
+                "upload_date_formatted": uploaded_at.strftime(UPLOAD_DATE_FORMAT),
                 "content_preview": content[:200] + "..." if len(content) > 200 else content,
                 "file_extension": os.path.splitext(filename)[1].lower(),
                 **metadata
@@ -209,18 +399,42 @@ class ResumeStorage:
                 resume_metadata["user_id"] = user_id
             logger.debug(f"[store_resume] Stored resume for user_id={user_id}")
             dest_filepath = os.path.join(RESUME_DIR, resume_metadata["stored_filename"])
-            shutil.copy2(temp_filepath, dest_filepath)
-            content_filepath = os.path.join(RESUME_DIR, f"{resume_id}_content.txt")
-            with open(content_filepath, 'w', encoding='utf-8') as f:
-                f.write(content)
-            self._index["resumes"][resume_id] = resume_metadata
-            self._index["count"] += 1
-            self._index["last_added"] = resume_id
-            self._save_index()
+            # In-memory uploads are written directly; spilled uploads are moved from the temp file
+            if data is not None:
+                with open(dest_filepath, 'wb') as f:
+                    f.write(data)
+            else:
+                _move_upload(temp_filepath, dest_filepath)
+            resume_content_store.put(resume_id, content)
+            if embeddings is not None:
+                resume_metadata["embedding_file"] = self._write_embeddings(resume_id, embeddings)
+            with self._locked_update() as index:
+                index["resumes"][resume_id] = resume_metadata
+                self._index_resume(resume_id, resume_metadata)
+                index["count"] += 1
+                index["last_added"] = resume_id
+                self._log_put(resume_id)
             logger.info(f"Resume {filename} stored with ID {resume_id}")
             return resume_id
         except Exception as e:
             logger.error(f"Error storing resume: {str(e)}")
             raise
+    # """Write narrative/skills embeddings as a (2, D) float32 .npy sidecar"""
+    def _write_embeddings(self, resume_id: str, embeddings: Dict[str, np.ndarray]) -> str:
+        embeddings_filename = f"{resume_id}_embeddings.npy"
+        stacked = np.stack([embeddings["narrative"], embeddings["skills"]]).astype(np.float32, copy=False)
+        np.save(os.path.join(RESUME_DIR, embeddings_filename), stacked)
+        return embeddings_filename
+    # """Store embeddings for an existing resume and drop any legacy JSON-list copies"""
+    def store_embeddings(self, resume_id: str, embeddings: Dict[str, np.ndarray]) -> None:
+        embedding_file = self._write_embeddings(resume_id, embeddings)
+        with self._locked_update() as index:
+            resume_metadata = index["resumes"][resume_id]
+            resume_metadata["embedding_file"] = embedding_file
+            for holder in (resume_metadata, resume_metadata.get("metadata") or {}):
+                holder.pop("embedding_narrative", None)
+                holder.pop("embedding_skills", None)
+            self._log_put(resume_id)
 # === Singleton Instance ===
-resume_storage = ResumeStorage()
\ No newline at end of file
+resume_storage = ResumeStorage()
+atexit.register(resume_storage.compact)
\ No newline at end of file
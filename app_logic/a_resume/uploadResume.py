@@ -1,53 +1,112 @@
 # logic/a_resume/uploadResume.py - Handles resume upload and parsing
+import io
 import os
+import mmap
+import shutil
 import tempfile
-import json
 import logging
+from functools import lru_cache
 from flask import Blueprint, request, redirect, url_for, flash, session
 from werkzeug.utils import secure_filename
+try:
+    from docx import Document
+    from lxml import etree
+except ImportError as e:
+    Document = None
+    _DOCX_IMPORT_ERROR = str(e)
 from app_logic.a_resume.resumeHistory import resume_storage
-from app_logic.b_jobs.jobMatch import generate_dual_embeddings
+from app_logic.b_jobs.jobMatch import generate_resume_embeddings, resume_content_hash
 logger = logging.getLogger(__name__)
 upload_resume_bp = Blueprint("upload_resume", __name__)
 # === Configuration ===
 ADZUNA_DATA_DIR = os.path.join(os.path.dirname(__file__), '../../static/job_data/adzuna')
 ADZUNA_INDEX_FILE = os.path.join(ADZUNA_DATA_DIR, 'index.json')
-RESUME_INDEX_FILE = os.path.join(os.path.dirname(__file__), '../../static/resumes/index.json')
 ALLOWED_EXTENSIONS = {"docx", "txt"}
+_ALLOWED_SUFFIXES = tuple(f".{ext}" for ext in ALLOWED_EXTENSIONS)
 TEMP_FOLDER = tempfile.gettempdir()
+# Uploads up to this size are parsed in memory; larger ones are spilled to TEMP_FOLDER
+MAX_IN_MEMORY_UPLOAD = 10 * 1024 * 1024
+# Spilled TXT uploads at least this large are decoded from an mmap
+MMAP_TXT_THRESHOLD = 64 * 1024
 
 # === Resume Parsing ===
 class FileParsingError(Exception):
     pass
-# """Extracts text from DOCX file including paragraphs, tables, headers, footers"""
+# WordprocessingML lookups compiled once; parse_docx reads the XML directly instead of building python-docx wrappers
+W_NS = {"w": "http://schemas.openxmlformats.org/wordprocessingml/2006/main",
+        "r": "http://schemas.openxmlformats.org/officeDocument/2006/relationships"}
+if Document is not None:
+    _RUN_CONTENT = "*[self::w:t or self::w:tab or self::w:ptab or self::w:br or self::w:cr or self::w:noBreakHyphen]"
+    _RUN_TEXT_NODES = etree.XPath(f"./w:r/{_RUN_CONTENT} | ./w:hyperlink/w:r/{_RUN_CONTENT}", namespaces=W_NS)
+    _CHILD_PARAGRAPHS = etree.XPath("./w:p", namespaces=W_NS)
+    _CHILD_TABLES = etree.XPath("./w:tbl", namespaces=W_NS)
+    _TABLE_ROW_CELLS = etree.XPath("./w:tr", namespaces=W_NS), etree.XPath("./w:tc", namespaces=W_NS)
+    _ROW_GRID_BEFORE = etree.XPath("./w:trPr/w:gridBefore/@w:val", namespaces=W_NS)
+    _CELL_GRID_SPAN = etree.XPath("./w:tcPr/w:gridSpan/@w:val", namespaces=W_NS)
+    _CELL_V_MERGE = etree.XPath("./w:tcPr/w:vMerge", namespaces=W_NS)
+    _SECTION_PROPERTIES = etree.XPath("./w:p/w:pPr/w:sectPr | ./w:sectPr", namespaces=W_NS)
+    _DEFAULT_HEADER_FOOTER_IDS = (etree.XPath("./w:headerReference[@w:type='default']/@r:id", namespaces=W_NS),
+                                  etree.XPath("./w:footerReference[@w:type='default']/@r:id", namespaces=W_NS))
+_W_T = f"{{{W_NS['w']}}}t"
+_W_BR_TYPE = f"{{{W_NS['w']}}}type"
+_W_VAL = f"{{{W_NS['w']}}}val"
+_W_TAG_TEXT = {f"{{{W_NS['w']}}}{name}": text for name, text in
+               (("tab", "\t"), ("ptab", "\t"), ("br", "\n"), ("cr", "\n"), ("noBreakHyphen", "-"))}
+# """Text of a <w:p> element, matching python-docx Paragraph.text for runs, tabs and breaks"""
+def _paragraph_text(p) -> str:
+    parts = []
+    for node in _RUN_TEXT_NODES(p):
+        if node.tag == _W_T:
+            parts.append(node.text or "")
+        elif node.get(_W_BR_TYPE, "textWrapping") == "textWrapping":
+            # Page and column breaks carry no text
+            parts.append(_W_TAG_TEXT[node.tag])
+    return "".join(parts)
+# """Non-blank paragraph texts directly under a body, cell, header or footer element"""
+def _paragraph_texts(parent):
+    return [text for text in map(_paragraph_text, _CHILD_PARAGRAPHS(parent)) if text.strip()]
+# """Cell texts of a <w:tr> per layout-grid column, repeating merged cells like python-docx _Row.cells
+# (above maps grid offsets of the previous row to their texts; the same map for this row is returned)"""
+def _row_cell_texts(row, above):
+    texts, offsets = [], {}
+    offset = int((_ROW_GRID_BEFORE(row) or [0])[0])
+    for cell in _TABLE_ROW_CELLS[1](row):
+        span = int((_CELL_GRID_SPAN(cell) or [1])[0])
+        v_merge = _CELL_V_MERGE(cell)
+        if v_merge and v_merge[0].get(_W_VAL, "continue") == "continue":
+            # Continuation of a vertical merge: the cell above (or its own root) holds the content
+            text = above.get(offset, "")
+        else:
+            text = " ".join(_paragraph_texts(cell))
+        offsets[offset] = text
+        texts.extend([text] * span)
+        offset += span
+    return texts, offsets
+# """Extracts text from DOCX file (path or file-like object) including paragraphs, tables, headers, footers"""
 def parse_docx(file_path):
-    try:
-        from docx import Document
-    except ImportError as e:
-        logger.error(f"DOCX parser unavailable: {str(e)}")
+    if Document is None:
+        logger.error(f"DOCX parser unavailable: {_DOCX_IMPORT_ERROR}")
         raise FileParsingError("DOCX parsing is not available. Please upload a TXT file instead.")
     try:
         doc = Document(file_path)
-        full_text = []
-        for para in doc.paragraphs:
-            if para.text.strip():
-                full_text.append(para.text)
-        for table in doc.tables:
-            for row in table.rows:
-                row_text = []
-                for cell in row.cells:
-                    cell_text = " ".join(p.text for p in cell.paragraphs if p.text.strip())
-                    if cell_text:
-                        row_text.append(cell_text.strip())
+        body = doc.element.body
+        full_text = _paragraph_texts(body)
+        for table in _CHILD_TABLES(body):
+            above = {}
+            for row in _TABLE_ROW_CELLS[0](table):
+                cell_texts, above = _row_cell_texts(row, above)
+                row_text = [cell_text.strip() for cell_text in cell_texts if cell_text]
                 if row_text:
                     full_text.append(" | ".join(row_text))
-        for section in doc.sections:
-            for paragraph in section.header.paragraphs:
-                if paragraph.text.strip():
-                    full_text.append(paragraph.text)
-            for paragraph in section.footer.paragraphs:
-                if paragraph.text.strip():
-                    full_text.append(paragraph.text)
+        # A section without its own default header/footer inherits the previous section's, as in python-docx
+        inherited = [None, None]
+        for sect_pr in _SECTION_PROPERTIES(body):
+            for i, reference_ids in enumerate(_DEFAULT_HEADER_FOOTER_IDS):
+                rel_ids = reference_ids(sect_pr)
+                if rel_ids:
+                    inherited[i] = doc.part.related_parts[rel_ids[0]].element
+                if inherited[i] is not None:
+                    full_text.extend(_paragraph_texts(inherited[i]))
         text = "\n".join(full_text).strip()
         if not text:
             raise FileParsingError("The DOCX file appears to be empty")
@@ -59,54 +118,67 @@ def parse_docx(file_path):
 # """Extracts text from a plain text file"""
 def parse_txt(file_path):
     try:
-        with open(file_path, "r", encoding="utf-8", errors="ignore") as f:
-            text = f.read().strip()
+        if os.path.getsize(file_path) < MMAP_TXT_THRESHOLD:
+            with open(file_path, "r", encoding="utf-8", errors="ignore") as f:
+                text = f.read().strip()
+        else:
+            # Decode straight from the mapped pages instead of reading a bytes copy first
+            with open(file_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                text = str(mm, "utf-8", "ignore").strip()
         if not text:
             raise FileParsingError("The text file appears to be empty")
         return text
     except Exception as e:
         logger.error(f"Error reading TXT: {str(e)}")
         raise FileParsingError(f"Failed to read text file: {str(e)}")
+# """Extracts text from plain text bytes already held in memory"""
+def parse_txt_bytes(data: bytes):
+    text = data.decode("utf-8", errors="ignore").strip()
+    if not text:
+        raise FileParsingError("The text file appears to be empty")
+    return text
 # """Dispatch parsing based on file extension"""
 def parse_resume(file_path):
     if not os.path.exists(file_path):
         raise FileParsingError(f"File not found: {file_path}")
-    ext = os.path.splitext(file_path)[1].lower()
-    if ext == ".docx":
+    lower = file_path.lower()
+    if lower.endswith(".docx"):
         return parse_docx(file_path)
-    elif ext == ".txt":
+    elif lower.endswith(".txt"):
         return parse_txt(file_path)
+    else:
+        raise FileParsingError(f"Unsupported file type: {os.path.splitext(lower)[1]}")
+# """Dispatch parsing of an in-memory upload based on file extension"""
+def parse_resume_bytes(data: bytes, ext: str):
+    ext = ext.lower()
+    if ext == ".docx":
+        return parse_docx(io.BytesIO(data))
+    elif ext == ".txt":
+        return parse_txt_bytes(data)
     else:
         raise FileParsingError(f"Unsupported file type: {ext}")
 # === Internal Utility ===
 # """Return True if the filename is a supported file type"""
 def allowed_file(filename: str) -> bool:
-    return "." in filename and filename.rsplit(".", 1)[1].lower() in ALLOWED_EXTENSIONS
-# """Save the resume index with embedded arrays converted to lists"""
+    return filename.lower().endswith(_ALLOWED_SUFFIXES)
+# """Memoized secure_filename; browsers tend to resend the same file names"""
+@lru_cache(maxsize=1024)
+def _secure_filename(filename: str) -> str:
+    return secure_filename(filename)
+# """Remove an upload that was spilled to the temp folder"""
+def _remove_temp_upload(filepath) -> None:
+    if filepath and os.path.exists(filepath):
+        os.remove(filepath)
+# """Write the resume index snapshot; embeddings already live in .npy sidecars beside it"""
 def export_resume_index_with_embeddings(resume_storage_instance) -> None:
-    try:
-        index_copy = {
-            "resumes": {},
-            "count": resume_storage_instance._index["count"],
-            "last_added": resume_storage_instance._index["last_added"]
-        }
-        for resume_id, resume_data in resume_storage_instance._index["resumes"].items():
-            resume_copy = resume_data.copy()
-            if "embedding" in resume_copy and hasattr(resume_copy["embedding"], "tolist"):
-                resume_copy["embedding"] = resume_copy["embedding"].tolist()
-            index_copy["resumes"][resume_id] = resume_copy
-        with open(RESUME_INDEX_FILE, 'w', encoding='utf-8') as f:
-            json.dump(index_copy, f, indent=2)
-        logger.info("Exported resume index with embeddings serialized")
-    except Exception as e:
-        logger.error(f"Error saving resume index: {str(e)}")
+    # compact() holds the index lock and truncates index.log with the snapshot, so no stale entry is replayed on top
+    resume_storage_instance.compact()
 
 
 # === Upload Resume Route ===
 # """Route for handling resume file upload and processing"""
 @upload_resume_bp.route("/upload_resume", methods=["POST"])
 def upload_resume():
-    from flask import session  # ✅ Ensure session is imported locally
     if "resume" not in request.files:
         flash("No file part", "danger")
         return redirect(url_for("index"))
@@ -117,16 +189,29 @@ def upload_resume():
         return redirect(url_for("index"))
 
     if file and allowed_file(file.filename):
-        filename = secure_filename(file.filename)
-        filepath = os.path.join(TEMP_FOLDER, filename)
-        file.save(filepath)
+        filename = _secure_filename(file.filename)
+        # Small uploads never touch the temp folder; large ones are streamed there in 1 MiB chunks
+        data = file.stream.read(MAX_IN_MEMORY_UPLOAD + 1)
+        filepath = None
+        if len(data) > MAX_IN_MEMORY_UPLOAD:
+            # A unique temp file per upload: concurrent uploads of the same name never share a path
+            fd, filepath = tempfile.mkstemp(suffix=os.path.splitext(filename)[1], dir=TEMP_FOLDER)
+            with os.fdopen(fd, "wb") as dst:
+                dst.write(data)
+                shutil.copyfileobj(file.stream, dst, length=1 << 20)
+            data = None
 
         try:
-            resume_text = parse_resume(filepath)
+            if filepath:
+                resume_text = parse_resume(filepath)
+            else:
+                resume_text = parse_resume_bytes(data, os.path.splitext(filename)[1])
         except FileParsingError as e:
+            _remove_temp_upload(filepath)
             flash(f"Resume parsing error: {str(e)}", "danger")
             return redirect(url_for("index"))
         except Exception as e:
+            _remove_temp_upload(filepath)
             logger.exception("Unexpected resume parsing error")
             flash(f"Unexpected error: {str(e)}", "danger")
             return redirect(url_for("index"))
@@ -139,10 +224,17 @@ def upload_resume():
             }
         }
 
-        # ✅ Generate embeddings
-        embeddings = generate_dual_embeddings(resume_text)
-        metadata["embedding_narrative"] = embeddings["narrative"].tolist()
-        metadata["embedding_skills"] = embeddings["skills"].tolist()
+        # ✅ Generate embeddings (reused when this exact resume text was seen before)
+        content_hash = resume_content_hash(resume_text)
+        metadata["content_hash"] = content_hash
+        try:
+            embeddings = generate_resume_embeddings(resume_text, content_hash)
+        except Exception as e:
+            # Nothing is stored without real embeddings; the upload can simply be retried
+            _remove_temp_upload(filepath)
+            logger.exception("Failed to generate resume embeddings")
+            flash(f"Embedding error: {str(e)}", "danger")
+            return redirect(url_for("index"))
 
         # ✅ Track who is uploading
         user_id = session.get("user_id")
@@ -151,16 +243,20 @@ def upload_resume():
         try:
             resume_id = resume_storage.store_resume(
                 temp_filepath=filepath,
+                data=data,
                 filename=filename,
                 content=resume_text,
                 metadata=metadata,
-                user_id=user_id
+                user_id=user_id,
+                embeddings=embeddings
             )
             logger.info(f"[upload_resume] Stored resume with ID {resume_id}")
             flash(f'Resume "{filename}" successfully uploaded and stored', "success")
         except Exception as e:
             logger.exception("Failed to store resume")
             flash(f"Resume storage error: {str(e)}", "danger")
+        finally:
+            _remove_temp_upload(filepath)
 
         return redirect(url_for("index"))
 
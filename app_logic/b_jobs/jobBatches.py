@@ -0,0 +1,71 @@
+# logic/b_jobs/jobBatches.py - Lists Adzuna batch files and keeps their parsed contents until a file changes
+import os
+import json
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+import orjson
+logger = logging.getLogger(__name__)
+# === Storage Paths ===
+ADZUNA_DATA_DIR = os.path.join(os.path.dirname(__file__), '../../static/job_data/adzuna')
+# Parsed batch files keyed by path, each stamped with the file's st_mtime_ns
+_BATCH_CACHE: Dict[str, Tuple[int, List[dict]]] = {}
+# === JSON Helpers ===
+# """Encode JSON to bytes (compact unless indent); numpy arrays and non-str keys are serialized natively"""
+def dumps_json(data, indent: bool = False, sort_keys: bool = False) -> bytes:
+    option = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+    if indent:
+        option |= orjson.OPT_INDENT_2
+    if sort_keys:
+        option |= orjson.OPT_SORT_KEYS
+    return orjson.dumps(data, option=option)
+# """Parse a JSON file"""
+def read_json(path: str):
+    with open(path, "rb") as f:
+        data = f.read()
+    try:
+        return orjson.loads(data)
+    except orjson.JSONDecodeError:
+        # Files written by the stdlib encoder may hold NaN/Infinity literals, which orjson rejects
+        return json.loads(data)
+# """Write JSON to a file, indented by two spaces unless indent=False; readers see the old or the new file, never a torn one"""
+def write_json(path: str, data, indent: bool = True) -> None:
+    # One temp name per writer thread, so concurrent writers never share a half-written file
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_path, "wb") as f:
+            f.write(dumps_json(data, indent=indent))
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+# === Batch Access ===
+# """batch_*.json entries in the data directory; DirEntry.stat() reuses the scandir result"""
+def batch_entries() -> List[os.DirEntry]:
+    try:
+        with os.scandir(ADZUNA_DATA_DIR) as entries:
+            return [entry for entry in entries if entry.name.startswith("batch_") and entry.name.endswith(".json")]
+    except FileNotFoundError:
+        return []
+# """Path and st_mtime_ns of every batch; equal signatures mean no batch was added, removed or rewritten"""
+def batch_signature(entries: List[os.DirEntry]) -> Tuple[Tuple[str, int], ...]:
+    return tuple((entry.path, entry.stat().st_mtime_ns) for entry in entries)
+# """Job dicts of one batch file, re-read only when its mtime changes (shared: treat as read-only)"""
+def load_batch(entry: os.DirEntry) -> List[dict]:
+    mtime = entry.stat().st_mtime_ns
+    cached = _BATCH_CACHE.get(entry.path)
+    if cached and cached[0] == mtime:
+        return cached[1]
+    jobs = read_json(entry.path)
+    _BATCH_CACHE[entry.path] = (mtime, jobs)
+    return jobs
+# """Drop a deleted batch from the cache"""
+def forget_batch(path: str) -> None:
+    _BATCH_CACHE.pop(path, None)
+# === Demo Helpers ===
+# """ISO timestamps for today and each of the previous N days; pick one with random.choice for a random recent date"""
+def recent_iso_dates(days: int, now: Optional[datetime] = None) -> List[str]:
+    now = now or datetime.now()
+    return [(now - timedelta(days=offset)).isoformat() for offset in range(days + 1)]
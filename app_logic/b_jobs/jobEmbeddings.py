@@ -0,0 +1,164 @@
+# logic/b_jobs/jobEmbeddings.py - Persists job embeddings as memory-mapped int8 matrices with per-vector scales
+import os
+import json
+import hashlib
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+try:
+    import fcntl
+except ImportError:  # Windows development machines; deployments are POSIX
+    fcntl = None
+from app_logic.b_jobs.jobBatches import dumps_json
+logger = logging.getLogger(__name__)
+# === Storage Paths ===
+ADZUNA_DATA_DIR = os.path.join(os.path.dirname(__file__), '../../static/job_data/adzuna')
+JOB_EMBEDDINGS_FILE = os.path.join(ADZUNA_DATA_DIR, 'job_embeddings.i8')
+JOB_EMBEDDINGS_SCALES_FILE = os.path.join(ADZUNA_DATA_DIR, 'job_embeddings.scales')
+JOB_EMBEDDINGS_KEYS_FILE = os.path.join(ADZUNA_DATA_DIR, 'job_embeddings.jsonl')
+# flock'd by every process that appends to, trims or reloads the store
+JOB_EMBEDDINGS_LOCK_FILE = os.path.join(ADZUNA_DATA_DIR, 'job_embeddings.lock')
+EMBEDDING_DIM = 384
+# Each row holds the narrative and skills embedding of one job: shape (2, EMBEDDING_DIM)
+ROW_SHAPE = (2, EMBEDDING_DIM)
+ROW_BYTES = 2 * EMBEDDING_DIM * np.dtype(np.int8).itemsize
+SCALE_ROW_BYTES = 2 * np.dtype(np.float32).itemsize
+# === Keys ===
+# """Content key for a job's embedding text: first 128 bits of its SHA-256, hex encoded"""
+def job_embedding_key(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:32]
+# === Quantization ===
+# """Symmetric per-vector int8 quantization: q = round(v * 127 / max|v|), returns (q, scale)"""
+def quantize_embeddings(vectors) -> Tuple[np.ndarray, np.ndarray]:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    peak = np.abs(vectors).max(axis=-1, keepdims=True)
+    # Zero vectors keep a scale of 1.0 so they dequantize back to zeros
+    scale = np.where(peak > 0, 127.0 / np.where(peak > 0, peak, 1.0), 1.0).astype(np.float32)
+    quantized = np.clip(np.rint(vectors * scale), -127, 127).astype(np.int8)
+    return quantized, scale[..., 0]
+# """Recover approximate float32 embeddings from int8 rows and their scales"""
+def dequantize_embeddings(quantized, scale) -> np.ndarray:
+    return np.asarray(quantized, dtype=np.float32) / np.asarray(scale, dtype=np.float32)[..., None]
+# === Cross-Process Locking ===
+# """Exclusive flock on the store's lock file; serializes appends and reloads across gunicorn workers"""
+@contextmanager
+def _store_file_lock():
+    if fcntl is None:
+        yield
+        return
+    os.makedirs(ADZUNA_DATA_DIR, exist_ok=True)
+    with open(JOB_EMBEDDINGS_LOCK_FILE, 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+# === Job Embedding Store ===
+# """Append-only (N, 2, D) int8 matrix and (N, 2) float32 scales on disk with a parallel JSONL list of job keys"""
+class JobEmbeddingStore:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._keys: List[str] = []
+        self._rows: Dict[str, int] = {}
+        self._matrix: Optional[np.memmap] = None
+        self._scales: Optional[np.memmap] = None
+        self._keys_size = -1
+        with _store_file_lock():
+            self._load()
+    # """Load the key list and trim any partially written trailing rows (caller holds the file lock)"""
+    def _load(self):
+        keys = []
+        try:
+            if os.path.exists(JOB_EMBEDDINGS_KEYS_FILE):
+                with open(JOB_EMBEDDINGS_KEYS_FILE, 'r', encoding='utf-8') as f:
+                    keys = [json.loads(line)["key"] for line in f if line.strip()]
+            row_count = os.path.getsize(JOB_EMBEDDINGS_FILE) // ROW_BYTES if os.path.exists(JOB_EMBEDDINGS_FILE) else 0
+            scale_count = os.path.getsize(JOB_EMBEDDINGS_SCALES_FILE) // SCALE_ROW_BYTES if os.path.exists(JOB_EMBEDDINGS_SCALES_FILE) else 0
+            if not (row_count == scale_count == len(keys)):
+                logger.warning(f"[job_embeddings] Store out of sync ({row_count} rows, {scale_count} scales, {len(keys)} keys); trimming")
+                keys = keys[:min(row_count, scale_count)]
+                self._rewrite(keys, row_count=len(keys))
+        except Exception as e:
+            logger.error(f"[job_embeddings] Failed to load store: {e}")
+            keys = []
+        self._keys = keys
+        self._rows = {key: i for i, key in enumerate(keys)}
+        self._matrix = None
+        self._scales = None
+        self._keys_size = os.path.getsize(JOB_EMBEDDINGS_KEYS_FILE) if os.path.exists(JOB_EMBEDDINGS_KEYS_FILE) else 0
+    # """Truncate all three files to the first row_count rows"""
+    def _rewrite(self, keys: List[str], row_count: int):
+        with open(JOB_EMBEDDINGS_KEYS_FILE, 'wb') as f:
+            f.writelines(dumps_json({"key": key}) + b"\n" for key in keys)
+        if os.path.exists(JOB_EMBEDDINGS_FILE):
+            os.truncate(JOB_EMBEDDINGS_FILE, row_count * ROW_BYTES)
+        if os.path.exists(JOB_EMBEDDINGS_SCALES_FILE):
+            os.truncate(JOB_EMBEDDINGS_SCALES_FILE, row_count * SCALE_ROW_BYTES)
+    # """Pick up rows appended by other worker processes; pass locked=True when the file lock is already held"""
+    def _refresh(self, locked: bool = False):
+        size = os.path.getsize(JOB_EMBEDDINGS_KEYS_FILE) if os.path.exists(JOB_EMBEDDINGS_KEYS_FILE) else 0
+        if size == self._keys_size:
+            return
+        if locked:
+            self._load()
+        else:
+            with _store_file_lock():
+                self._load()
+    # """Memory-map the int8 embedding matrix (remapped after every append)"""
+    @property
+    def matrix(self) -> np.ndarray:
+        if self._matrix is None:
+            if not self._keys:
+                return np.zeros((0,) + ROW_SHAPE, dtype=np.int8)
+            self._matrix = np.memmap(JOB_EMBEDDINGS_FILE, dtype=np.int8, mode='r', shape=(len(self._keys),) + ROW_SHAPE)
+        return self._matrix
+    # """Memory-map the (N, 2) float32 quantization scales"""
+    @property
+    def scales(self) -> np.ndarray:
+        if self._scales is None:
+            if not self._keys:
+                return np.zeros((0, 2), dtype=np.float32)
+            self._scales = np.memmap(JOB_EMBEDDINGS_SCALES_FILE, dtype=np.float32, mode='r', shape=(len(self._keys), 2))
+        return self._scales
+    # """Return the row index of each key, or None when it has not been stored yet"""
+    def get_rows(self, keys: List[str]) -> List[Optional[int]]:
+        with self._lock:
+            self._refresh()
+            return [self._rows.get(key) for key in keys]
+    # """Quantize and append narrative/skills embeddings for new keys and return their row indices"""
+    def add(self, keys: List[str], narrative: np.ndarray, skills: np.ndarray) -> List[int]:
+        rows, row_scales = quantize_embeddings(np.stack([narrative, skills], axis=1))
+        # The file lock spans refresh and append, so no other process writes rows between the two
+        with self._lock, _store_file_lock():
+            self._refresh(locked=True)
+            new_keys, new_indices = [], []
+            for i, key in enumerate(keys):
+                if key in self._rows or key in new_keys:
+                    continue
+                new_keys.append(key)
+                new_indices.append(i)
+            if new_keys:
+                try:
+                    os.makedirs(ADZUNA_DATA_DIR, exist_ok=True)
+                    # Embeddings and scales are written before keys so a crash never leaves a key without its row
+                    with open(JOB_EMBEDDINGS_FILE, 'ab') as f:
+                        f.write(np.ascontiguousarray(rows[new_indices]).tobytes())
+                    with open(JOB_EMBEDDINGS_SCALES_FILE, 'ab') as f:
+                        f.write(np.ascontiguousarray(row_scales[new_indices]).tobytes())
+                    with open(JOB_EMBEDDINGS_KEYS_FILE, 'ab') as f:
+                        f.writelines(dumps_json({"key": key}) + b"\n" for key in new_keys)
+                    for key in new_keys:
+                        self._rows[key] = len(self._keys)
+                        self._keys.append(key)
+                    self._matrix = None
+                    self._scales = None
+                    self._keys_size = os.path.getsize(JOB_EMBEDDINGS_KEYS_FILE)
+                    logger.info(f"[job_embeddings] Stored {len(new_keys)} new job embeddings (total {len(self._keys)})")
+                except Exception as e:
+                    logger.error(f"[job_embeddings] Failed to append embeddings: {e}")
+                    self._load()
+            return [self._rows.get(key) for key in keys]
+# === Singleton Instance ===
+job_embedding_store = JobEmbeddingStore()
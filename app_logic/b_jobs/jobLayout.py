@@ -1,43 +1,67 @@
 # logic/b_jobs/jobLayout.py - Blueprint and logic for rendering job and batch data tables
 import logging
-import os
-import json
+import hashlib
+import os
 import random
+import time
 import numpy as np
-from datetime import datetime, timedelta
-from flask import Blueprint, jsonify
+from typing import Dict, List, Optional, Tuple
+from flask import Blueprint, Response, jsonify, request, stream_with_context
 from app_logic.a_resume.resumeHistory import get_all_resumes, get_resume_content
-from app_logic.b_jobs.jobMatch import Job, get_all_jobs, resolve_resume_embeddings, match_and_cache_jobs
+from app_logic.b_jobs.jobBatches import ADZUNA_DATA_DIR, batch_entries, dumps_json, forget_batch, load_batch, recent_iso_dates
+from app_logic.b_jobs.jobMatch import Job, get_all_jobs, resolve_resume_embeddings, match_and_cache_jobs, top_k_indices
 logger = logging.getLogger(__name__)
 # Define the blueprint
 layout_bp = Blueprint("layout_bp", __name__)
 # === Constants ===
-ADZUNA_DATA_DIR = os.path.join(os.path.dirname(__file__), '../../static/job_data/adzuna')
 ADZUNA_INDEX_FILE = os.path.join(ADZUNA_DATA_DIR, 'index.json')
+# Job listings at least this long are streamed one record at a time
+STREAM_JOBS_THRESHOLD = 100
+# Per-batch summaries keyed by path, each stamped with the file's st_mtime_ns
+_BATCH_SUMMARY_CACHE: Dict[str, Tuple[int, dict]] = {}
+# Serialized API payloads, reused until the batch listing ETag changes
+_jobs_payload_cache = {"etag": None, "body": None}
+_match_payload_cache: Dict[str, Tuple[str, str, bytes, List[str], np.ndarray]] = {}  # resume_id -> (jobs etag, payload etag, body, urls, percentages)
+API_CACHE_CONTROL = "private, max-age=5"
 # === Helpers ===
-# Generate a random date within the last N days
-def _random_date_within(days: int) -> str:
-    return (datetime.now() - timedelta(days=random.randint(0, days))).isoformat()
-# Load a fixed number of jobs from demo batches
+# Load a fixed number of jobs from demo batches, newest batch first
 def _load_jobs_from_batches(count=25):
     jobs = []
+    recent_dates = recent_iso_dates(10)
     try:
-        for filename in os.listdir(ADZUNA_DATA_DIR):
-            if filename.startswith("batch_") and filename.endswith(".json"):
-                path = os.path.join(ADZUNA_DATA_DIR, filename)
-                with open(path, "r", encoding="utf-8") as f:
-                    for job in json.load(f):
-                        try:
-                            job_obj = Job(**job)
-                            job_obj.posted_date = _random_date_within(10)
-                            jobs.append(job_obj)
-                            if len(jobs) >= count:
-                                return jobs
-                        except Exception as e:
-                            logger.warning(f"[demo job load] Failed to parse job: {e}")
+        # Stops at the first batches that fill the quota; older batches are never opened
+        for entry in sorted(batch_entries(), key=lambda e: e.stat().st_mtime_ns, reverse=True):
+            for job in load_batch(entry):
+                try:
+                    job_obj = Job(**job)
+                    job_obj.posted_date = random.choice(recent_dates)
+                    jobs.append(job_obj)
+                    if len(jobs) >= count:
+                        return jobs
+                except Exception as e:
+                    logger.warning(f"[demo job load] Failed to parse job: {e}")
     except Exception as e:
         logger.error(f"Error loading demo batch jobs: {str(e)}")
     return jobs[:count]
+# Weak ETag for the job listing: changes whenever a batch file is added, removed or rewritten
+def _jobs_etag(entries: Optional[List[os.DirEntry]] = None) -> str:
+    entries = batch_entries() if entries is None else entries
+    latest = max((entry.stat().st_mtime_ns for entry in entries), default=0)
+    return f'W/"{len(entries)}-{latest}"'
+# True when the client's If-None-Match lists this ETag
+def _etag_matches(etag: str) -> bool:
+    return etag in (tag.strip() for tag in request.headers.get("If-None-Match", "").split(","))
+# Stream the same body jsonify({"success": True, "jobs": [...]}) produces without materializing the job dicts up front
+def _stream_jobs(jobs) -> Response:
+    def generate():
+        yield b'{"jobs":['
+        for i, job in enumerate(jobs):
+            if i:
+                yield b','
+            # Compact and key-sorted like jsonify
+            yield dumps_json(normalize_job(job), sort_keys=True)
+        yield b'],"success":true}'
+    return Response(stream_with_context(generate()), mimetype="application/json")
 # Normalize any job to a dictionary (Job object or dict)
 def normalize_job(job):
     try:
@@ -63,7 +87,8 @@ def generate_table_context(session):
         stored_resumes = get_all_resumes()
         resume_id = session.get("resume_id")
 
-        if resume_id and not any(r["id"] == resume_id for r in stored_resumes):
+        stored_ids = {r["id"] for r in stored_resumes}
+        if resume_id and resume_id not in stored_ids:
             logger.warning(f"Session resume_id {resume_id} is invalid. Clearing it.")
             session.pop("resume_id", None)
             resume_id = None
@@ -92,9 +117,15 @@ def generate_table_context(session):
             logger.warning("No resume ID provided, skipping match percentages")
             jobs_with_breakdown = [normalize_job(job) for job in jobs]
 
-        remote_jobs = [job for job in jobs_with_breakdown if job.get("is_remote")]
-        jobs_dict = {job["url"]: job for job in jobs_with_breakdown if job.get("url")}
-        remote_dict = {job["url"]: job for job in remote_jobs if job.get("url")}
+        # One pass builds both lookups; remote jobs share the same dicts
+        jobs_dict, remote_dict = {}, {}
+        for job in jobs_with_breakdown:
+            url = job.get("url")
+            if not url:
+                continue
+            jobs_dict[url] = job
+            if job.get("is_remote"):
+                remote_dict[url] = job
 
         return {
             "jobs": jobs_dict,
@@ -118,9 +149,22 @@ def generate_table_context(session):
 @layout_bp.route("/api/jobs", methods=["GET"])
 def get_jobs():
     try:
+        etag = _jobs_etag()
+        headers = {"ETag": etag, "Cache-Control": API_CACHE_CONTROL}
+        if _etag_matches(etag):
+            return "", 304, headers
+        if _jobs_payload_cache["etag"] == etag:
+            return Response(_jobs_payload_cache["body"], mimetype="application/json", headers=headers)
         jobs = get_all_jobs()
         logger.debug("Retrieved %d jobs for API", len(jobs))
-        return jsonify({"success": True, "jobs": [normalize_job(job) for job in jobs]})
+        if len(jobs) >= STREAM_JOBS_THRESHOLD:
+            # Streamed to keep large listings out of memory, so there is no body to cache
+            response = _stream_jobs(jobs)
+        else:
+            response = jsonify({"success": True, "jobs": [normalize_job(job) for job in jobs]})
+            _jobs_payload_cache.update(etag=etag, body=response.get_data())
+        response.headers.update(headers)
+        return response
     except Exception as e:
         logger.error(f"Error fetching jobs: {str(e)}")
         return jsonify({"success": False, "error": str(e)})
@@ -133,6 +177,8 @@ def delete_batch(batch_id):
         if not os.path.exists(path):
             return jsonify({"success": False, "error": f"Batch file '{filename}' not found"}), 404
         os.remove(path)
+        forget_batch(path)
+        _BATCH_SUMMARY_CACHE.pop(path, None)
         logger.info(f"Deleted batch file: {filename}")
         return jsonify({"success": True, "batch_id": batch_id})
     except Exception as e:
@@ -146,45 +192,84 @@ def get_match_percentages_for_resume(resume_id):
         if not resume_text:
             return jsonify({"success": False, "error": "Resume content not found"}), 404
 
-        jobs = get_all_jobs()
-        cached_matches = match_and_cache_jobs(jobs, resume_id, resume_text or "")
+        # Matches only change when batches are added or removed; reuse the serialized payload until then
+        jobs_etag = _jobs_etag()
+        cached = _match_payload_cache.get(resume_id)
+        if cached and cached[0] == jobs_etag:
+            etag, body, urls, percentages = cached[1:]
+        else:
+            jobs = get_all_jobs()
+            cached_matches = match_and_cache_jobs(jobs, resume_id, resume_text or "")
 
-        return jsonify({
-            "success": True,
-            "matches": {
-                url: int(match.similarity_score * 100)
-                for url, match in cached_matches.items()
-                if not np.isnan(match.similarity_score)
-            }
-        })
+            # NaN filtering, scaling and truncation run over one array instead of per match
+            scores = np.fromiter((match.similarity_score for match in cached_matches.values()), dtype=np.float64, count=len(cached_matches))
+            valid = ~np.isnan(scores)
+            percentages = (scores[valid] * 100).astype(np.int64)
+            urls = [url for url, ok in zip(cached_matches, valid.tolist()) if ok]
+            body = jsonify({
+                "success": True,
+                "matches": dict(zip(urls, percentages.tolist()))
+            }).get_data()
+            etag = f'"{hashlib.blake2b(body, digest_size=8).hexdigest()}"'
+            for stale_id in [rid for rid, entry in _match_payload_cache.items() if entry[0] != jobs_etag]:
+                _match_payload_cache.pop(stale_id, None)
+            _match_payload_cache[resume_id] = (jobs_etag, etag, body, urls, percentages)
+
+        # Optional ?top_k=N returns only the N best matches, cut from the cached full result
+        top_k = request.args.get("top_k", type=int)
+        if top_k is not None and max(top_k, 0) < len(urls):
+            best = top_k_indices(percentages, top_k)
+            body = jsonify({
+                "success": True,
+                "matches": {urls[i]: int(percentages[i]) for i in best}
+            }).get_data()
+            etag = f'"{hashlib.blake2b(body, digest_size=8).hexdigest()}"'
+        headers = {"ETag": etag, "Cache-Control": API_CACHE_CONTROL}
+        if _etag_matches(etag):
+            return "", 304, headers
+        return Response(body, mimetype="application/json", headers=headers)
     except Exception as e:
         logger.error(f"Error fetching matches for resume {resume_id}: {str(e)}")
         return jsonify({"success": False, "error": str(e)}), 500
 
+# Batch summary cached against the batch listing (see _jobs_etag); rebuilt only after a sync or delete
+_storage_status_cache = {"etag": None, "status": None}
 # Batch metadata summarization for frontend display
 def get_storage_status() -> dict:
+    # One directory scan serves both the ETag check and the summaries
+    entries = batch_entries()
+    etag = _jobs_etag(entries)
+    if _storage_status_cache["etag"] == etag:
+        return _storage_status_cache["status"]
     batches = {}
     try:
-        for filename in os.listdir(ADZUNA_DATA_DIR):
-            if not filename.startswith("batch_") or not filename.endswith(".json"):
+        seen = set()
+        for entry in entries:
+            batch_id = entry.name[6:-5]  # strip "batch_" and ".json"
+            stat = entry.stat()
+            seen.add(entry.path)
+            # Only batches added or rewritten since the last summary are parsed again
+            cached = _BATCH_SUMMARY_CACHE.get(entry.path)
+            if cached and cached[0] == stat.st_mtime_ns:
+                batches[batch_id] = cached[1]
                 continue
-            batch_id = filename.removeprefix("batch_").removesuffix(".json")
-            path = os.path.join(ADZUNA_DATA_DIR, filename)
             try:
-                file_ctime = os.path.getctime(path)
-                timestamp_str = datetime.fromtimestamp(file_ctime).strftime("%Y-%m-%d %I:%M %p")
+                timestamp_str = time.strftime("%Y-%m-%d %I:%M %p", time.localtime(stat.st_ctime))
             except Exception:
                 timestamp_str = "Unknown"
-            with open(path, 'r', encoding='utf-8') as f:
-                jobs = json.load(f)
-                job_count = len(jobs)
-                first_job = jobs[0] if jobs else {}
-                batches[batch_id] = {
-                    "timestamp": timestamp_str,
-                    "job_count": job_count,
-                    "keywords": ", ".join(first_job.get("skills", [])) if first_job.get("skills") else "",
-                    "location": first_job.get("location", "")
-                }
+            jobs = load_batch(entry)
+            first_job = jobs[0] if jobs else {}
+            batches[batch_id] = {
+                "timestamp": timestamp_str,
+                "job_count": len(jobs),
+                "keywords": ", ".join(first_job.get("skills", [])) if first_job.get("skills") else "",
+                "location": first_job.get("location", "")
+            }
+            _BATCH_SUMMARY_CACHE[entry.path] = (stat.st_mtime_ns, batches[batch_id])
+        for path in set(_BATCH_SUMMARY_CACHE) - seen:
+            _BATCH_SUMMARY_CACHE.pop(path, None)
     except Exception as e:
         logger.error(f"[get_storage_status] Failed to generate batch summary: {str(e)}")
-    return {"batches": batches}
\ No newline at end of file
+        return {"batches": batches}
+    _storage_status_cache.update(etag=etag, status={"batches": batches})
+    return _storage_status_cache["status"]
\ No newline at end of file
@@ -1,26 +1,56 @@
 # logic/b_jobs/jobMatch.py - Comprehensive matching logic
 import re
 import json
+import hashlib
 import logging
+import queue
+import threading
+import time
+from bisect import bisect_right
+from collections import OrderedDict
+from concurrent.futures import Future
 from datetime import datetime
 from typing import List, Dict, Optional, Tuple
 import numpy as np
-from sklearn.feature_extraction.text import ENGLISH_STOP_WORDS, HashingVectorizer
+from sklearn.feature_extraction.text import ENGLISH_STOP_WORDS
 import os
+# Read by transformers/tokenizers when the model is first loaded (see get_model)
 os.environ["TRANSFORMERS_NO_TQDM"] = "1"
 os.environ["TOKENIZERS_PARALLELISM"] = "false"
-from sentence_transformers import SentenceTransformer
-from app_logic.a_resume.resumeHistory import get_resume_content, get_resume, resume_storage
+try:
+    import simsimd
+except ImportError:
+    simsimd = None
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+from app_logic.a_resume.resumeHistory import get_resume_content, get_resume, get_resume_embeddings, resume_storage
+from app_logic.b_jobs.jobBatches import ADZUNA_DATA_DIR, batch_entries, batch_signature, load_batch, read_json, write_json
+from app_logic.b_jobs.jobEmbeddings import job_embedding_key, job_embedding_store, quantize_embeddings
 logger = logging.getLogger(__name__)
-ADZUNA_DATA_DIR = os.path.join(os.path.dirname(__file__), '../../static/job_data/adzuna')
 MATCH_CACHE_PATH = os.path.join(ADZUNA_DATA_DIR, 'match_cache.json')
 SKILLS_PATH = os.path.join(os.path.dirname(__file__), '../../skills.json')
 TITLE_MAP_PATH = os.path.join(os.path.dirname(__file__), '../../title_map.json')
 EMBEDDING_DIM = 384
-model = SentenceTransformer('all-MiniLM-L6-v2')
-vectorizer = HashingVectorizer(n_features=384, alternate_sign=False, norm='l2', stop_words='english', lowercase=True)
+MODEL_NAME = 'all-MiniLM-L6-v2'
+# === Sentence Encoder ===
+_model = None
+_model_lock = threading.Lock()
+# Load the SentenceTransformer on first use; requests answered from caches never import torch
+def get_model():
+    global _model
+    if _model is None:
+        with _model_lock:
+            if _model is None:
+                from sentence_transformers import SentenceTransformer
+                _model = SentenceTransformer(MODEL_NAME)
+    return _model
 # === Job Model ===
 class Job:
+    # Fixed attribute set: instances carry no per-object __dict__
+    __slots__ = ('title', 'company', 'description', 'location', 'is_remote', 'posted_date', 'url', 'skills',
+                 'salary_range', 'match_percentage')
     # Track ignored field occurrences for batch logging
     _ignored_field_counts: Dict[str, int] = {}
     def __init__(self, title, company, description, location, is_remote=False,
@@ -38,10 +68,8 @@ class Job:
         self.skills = skills or []
         self.salary_range = salary_range or ""
         self.match_percentage = match_percentage
-        self.embedding_narrative: Optional[np.ndarray] = None
-        self.embedding_skills: Optional[np.ndarray] = None
     # Serialize job object to dictionary
-    def to_dict(self, include_embeddings=False):
+    def to_dict(self):
         return {
             'title': self.title,
             'company': self.company,
@@ -63,6 +91,7 @@ class Job:
             cls._ignored_field_counts.clear()
 # === Resume-to-Job Matching Model ===
 class JobMatch:
+    __slots__ = ('job', 'similarity_score', 'breakdown')
     def __init__(self, job, similarity_score: float, breakdown: Optional[Dict] = None):
         self.job = job
         self.similarity_score = similarity_score
@@ -74,38 +103,62 @@ class JobMatch:
             'similarity_score': self.similarity_score,
             'breakdown': self.breakdown
         }
+# Parsed mapping files keyed by path, stamped with st_mtime_ns; the same dict is returned until the file changes
+_mapping_cache: Dict[str, Tuple[int, Dict[str, str]]] = {}
+def _load_mapping(path: str) -> Dict[str, str]:
+    mtime = os.stat(path).st_mtime_ns
+    cached = _mapping_cache.get(path)
+    if cached and cached[0] == mtime:
+        return cached[1]
+    with open(path, 'r', encoding='utf-8') as f:
+        mapping = json.load(f)
+    _mapping_cache[path] = (mtime, mapping)
+    return mapping
 # === Skill Mapping Utility ===
+# Shared, read-only map; reusing the same object also keeps the skill automaton cache warm
 def load_skill_map() -> Dict[str, str]:
     try:
-        with open(SKILLS_PATH, 'r', encoding='utf-8') as f:
-            return json.load(f)
+        return _load_mapping(SKILLS_PATH)
     except Exception as e:
         logger.warning(f"[load_skill_map] Failed: {e}")
         return {}
 # === Title Mapping Utility ===
 def load_title_map() -> Dict[str, str]:
     try:
-        with open(TITLE_MAP_PATH, 'r', encoding='utf-8') as f:
-            return json.load(f)
+        return _load_mapping(TITLE_MAP_PATH)
     except Exception as e:
         logger.warning(f"[load_title_map] Failed: {e}")
         return {}
+# Patterns used by the text helpers below, compiled once at import
+_RE_NONALNUM = re.compile(r'[^a-z0-9\s]')
+_RE_WS = re.compile(r'\s+')
+_RE_TOKEN = re.compile(r'\b[a-zA-Z0-9\-]{3,}\b')
+_RE_SENT = re.compile(r'(?<=[.!?]) +')
+_STOP_WORDS = frozenset(ENGLISH_STOP_WORDS)
 # Normalize text for embedding: Lowercase, Remove non-alphanumerics, Collapse whitespace
 def clean_text(text: str) -> str:
-    return re.sub(r'\s+', ' ', re.sub(r'[^a-z0-9\s]', ' ', text.lower())).strip()
+    return _RE_WS.sub(' ', _RE_NONALNUM.sub(' ', text.lower())).strip()
 # Tokenize text into a set of words, excluding stop words from matching
 def tokenize_clean(text: str) -> set:
-    return {w for w in re.findall(r'\b[a-zA-Z0-9\-]{3,}\b', text.lower()) if w not in ENGLISH_STOP_WORDS}
-# Generate embedding vector for the input text using deterministic hashing
-def generate_embedding(text: str) -> np.ndarray:
-    try:
-        return np.asarray(model.encode(clean_text(text)), dtype=np.float32)
-    except Exception as e:
-        logger.error(f"[embedding] Failed: {e}")
-        return np.zeros((EMBEDDING_DIM,), dtype=np.float32)
+    return {w for w in _RE_TOKEN.findall(text.lower()) if w not in _STOP_WORDS}
+# tokenize_clean for many texts: one regex scan over the joined texts, tokens bucketed back by offset
+def tokenize_clean_many(texts: List[str]) -> List[set]:
+    token_sets = [set() for _ in texts]
+    # Lowercase per text first so offsets hold even when lowercasing changes a string's length
+    lowered = [text.lower() for text in texts]
+    ends, position = [], 0
+    for text in lowered:
+        position += len(text) + 1
+        ends.append(position)
+    # \x1f is never part of a token, so no match can span two texts
+    for match in _RE_TOKEN.finditer("\x1f".join(lowered)):
+        word = match.group()
+        if word not in _STOP_WORDS:
+            token_sets[bisect_right(ends, match.start())].add(word)
+    return token_sets
 # Sentence-aware chunking that splits text into chunks close to max_length.
 def chunk_text(text, max_length=512, overlap=50):
-    sentences = re.split(r'(?<=[.!?]) +', text)
+    sentences = _RE_SENT.split(text)
     chunks, current_chunk = [], ""
     for sentence in sentences:
         if len(current_chunk) + len(sentence) > max_length:
@@ -116,20 +169,89 @@ def chunk_text(text, max_length=512, overlap=50):
     if current_chunk:
         chunks.append(current_chunk.strip())
     return chunks
+# === Encoder Micro-Batching ===
+ENCODE_BATCH_WINDOW = 0.005  # seconds a batch waits for concurrent callers
+ENCODE_BATCH_MAX_TEXTS = 64
+ENCODE_BATCH_SIZE = 64
+# Request threads hand their texts to one worker thread, which merges calls arriving within the window into one model.encode
+class EncodeBatcher:
+    def __init__(self, window: float = ENCODE_BATCH_WINDOW, max_texts: int = ENCODE_BATCH_MAX_TEXTS):
+        self.window = window
+        self.max_texts = max_texts
+        self._queue: "queue.Queue[Tuple[List[str], Future]]" = queue.Queue()
+        self._worker: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+    # Started on first use so each worker process (forked by gunicorn) runs its own thread
+    def _ensure_worker(self):
+        if self._worker is not None and self._worker.is_alive():
+            return
+        with self._start_lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name="encode-batcher", daemon=True)
+                self._worker.start()
+    # Embed texts, blocking until the batch containing them has been encoded; rows follow the input order
+    def encode(self, texts: List[str]) -> np.ndarray:
+        if not texts:
+            return np.zeros((0, EMBEDDING_DIM), dtype=np.float32)
+        future: Future = Future()
+        self._ensure_worker()
+        self._queue.put((list(texts), future))
+        return future.result()
+    # Collect pending calls until the window closes or max_texts is reached
+    def _next_batch(self) -> List[Tuple[List[str], Future]]:
+        batch = [self._queue.get()]
+        total = len(batch[0][0])
+        deadline = time.monotonic() + self.window
+        while total < self.max_texts:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            batch.append(item)
+            total += len(item[0])
+        return batch
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            texts = [text for item_texts, _ in batch for text in item_texts]
+            try:
+                embeddings = np.asarray(get_model().encode(texts, batch_size=ENCODE_BATCH_SIZE, show_progress_bar=False), dtype=np.float32)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            offset = 0
+            for item_texts, future in batch:
+                future.set_result(embeddings[offset:offset + len(item_texts)])
+                offset += len(item_texts)
+encode_batcher = EncodeBatcher()
 # Generate an averaged embedding over multiple text chunks using SentenceTransformer
 def generate_embedding_for_long_text(text: str) -> np.ndarray:
-    cleaned = clean_text(text)
-    if len(cleaned) < 10:
-        return np.zeros((EMBEDDING_DIM,), dtype=np.float32)
-    chunks = chunk_text(cleaned)
-    try:
-        embeddings = model.encode(chunks, show_progress_bar=False)
-        return np.mean(np.asarray(embeddings, dtype=np.float32), axis=0)
-    except Exception as e:
-        logger.error(f"[embedding_long] Failed: {e}")
-        return np.zeros((EMBEDDING_DIM,), dtype=np.float32)
-# Generate two embeddings: one for the full narrative, one for just the skills section.
-def generate_dual_embeddings(text: str) -> Dict[str, np.ndarray]:
+    return generate_embeddings_for_long_texts([text])[0]
+# Averaged chunk embeddings for many texts from a single model.encode call; texts under 10 cleaned chars get zeros
+# Encoder failures raise so that no caller ever stores zero vectors in place of real embeddings
+def generate_embeddings_for_long_texts(texts: List[str]) -> np.ndarray:
+    result = np.zeros((len(texts), EMBEDDING_DIM), dtype=np.float32)
+    owners, all_chunks, offsets = [], [], []
+    for i, text in enumerate(texts):
+        cleaned = clean_text(text)
+        if len(cleaned) < 10:
+            continue
+        owners.append(i)
+        offsets.append(len(all_chunks))
+        all_chunks.extend(chunk_text(cleaned))
+    if not all_chunks:
+        return result
+    embeddings = encode_batcher.encode(all_chunks)
+    # Sum each text's run of chunk rows in one pass, then divide by its chunk count
+    counts = np.diff(offsets + [len(all_chunks)])
+    result[owners] = np.add.reduceat(embeddings, offsets, axis=0) / counts[:, None]
+    return result
+# Lines following a skills/technologies/tools heading, joined into one string
+def extract_skill_text(text: str) -> str:
     skill_lines = []
     skill_keywords = ['skills', 'technologies', 'tools']
     collecting = False
@@ -140,11 +262,52 @@ def generate_dual_embeddings(text: str) -> Dict[str, np.ndarray]:
         if collecting and (line.strip() == "" or len(skill_lines) > 5):
             break
         skill_lines.append(line.strip())
-    skill_text = " ".join(skill_lines)
+    return " ".join(skill_lines)
+# Generate two embeddings: one for the full narrative, one for just the skills section.
+# Both sections' chunks go through a single encode call
+def generate_dual_embeddings(text: str) -> Dict[str, np.ndarray]:
+    narrative, skills = generate_dual_embeddings_batch([text])
     return {
-        "narrative": generate_embedding_for_long_text(text),
-        "skills": generate_embedding_for_long_text(skill_text)
+        "narrative": narrative[0],
+        "skills": skills[0]
     }
+# Batched generate_dual_embeddings: (narrative, skills) arrays of shape (len(texts), EMBEDDING_DIM) from one encode call
+def generate_dual_embeddings_batch(texts: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+    stacked = generate_embeddings_for_long_texts(list(texts) + [extract_skill_text(text) for text in texts])
+    return stacked[:len(texts)], stacked[len(texts):]
+# === Resume Embedding Cache ===
+RESUME_EMBEDDING_CACHE_SIZE = 32
+_resume_embedding_cache: "OrderedDict[str, Dict[str, np.ndarray]]" = OrderedDict()
+_resume_embedding_lock = threading.Lock()
+# Hash resume text so identical uploads can share embeddings
+def resume_content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+# Find embeddings already stored for a resume with the same content hash
+def _stored_resume_embeddings(content_hash: str) -> Optional[Dict[str, np.ndarray]]:
+    for resume in list(resume_storage._index.get("resumes", {}).values()):
+        if resume.get("content_hash") != content_hash or not resume.get("embedding_file"):
+            continue
+        stored = get_resume_embeddings(resume["id"])
+        if stored:
+            return stored
+    return None
+# Generate dual embeddings for resume text, skipping the model for previously seen content
+def generate_resume_embeddings(text: str, content_hash: Optional[str] = None) -> Dict[str, np.ndarray]:
+    content_hash = content_hash or resume_content_hash(text)
+    with _resume_embedding_lock:
+        cached = _resume_embedding_cache.get(content_hash)
+        if cached is not None:
+            _resume_embedding_cache.move_to_end(content_hash)
+            logger.debug(f"[resume_embeddings] Cache hit for {content_hash[:12]}")
+            return cached
+    embeddings = _stored_resume_embeddings(content_hash) or generate_dual_embeddings(text)
+    for vector in embeddings.values():
+        vector.setflags(write=False)  # Shared between callers; never modify in place
+    with _resume_embedding_lock:
+        _resume_embedding_cache[content_hash] = embeddings
+        while len(_resume_embedding_cache) > RESUME_EMBEDDING_CACHE_SIZE:
+            _resume_embedding_cache.popitem(last=False)
+    return embeddings
 # === Guess resume title from the first role-like line in resume text ===
 def extract_resume_title(text: Optional[str]) -> str:
     if not text:
@@ -158,7 +321,27 @@ def normalize_title(title: str, title_map: Dict[str, str]) -> str:
     return title_map.get(title.lower().strip(), title)
 # === Skill Category Matching ===
 def find_skill_categories_in_text(text: str, skill_map: Dict[str, str]) -> set:
-    return {cat for skill, cat in skill_map.items() if skill in text.lower()}
+    text = text.lower()
+    automaton = _skill_automaton(skill_map)
+    if automaton is not None:
+        return {cat for _, cat in automaton.iter(text)}
+    return {cat for skill, cat in skill_map.items() if skill in text}
+# Build (once per skill map) an Aho-Corasick automaton so every skill is found in a single pass over the text
+_skill_automaton_cache: Tuple[Optional[Dict[str, str]], object] = (None, None)
+def _skill_automaton(skill_map: Dict[str, str]):
+    global _skill_automaton_cache
+    if ahocorasick is None or not skill_map:
+        return None
+    cached_map, automaton = _skill_automaton_cache
+    if cached_map is not skill_map:
+        # Skills are added as-is, matching the substring test against lowercased text
+        automaton = ahocorasick.Automaton()
+        for skill, cat in skill_map.items():
+            if skill:
+                automaton.add_word(skill, cat)
+        automaton.make_automaton()
+        _skill_automaton_cache = (skill_map, automaton)
+    return automaton
 # === Aggregates boost_score_with_skills logs ===
 class BoostScoreLogCounter:
     count = 0
@@ -177,77 +360,75 @@ class BoostScoreLogCounter:
         logger.info(f"[boost_score_with_skills] Total jobs scored: {cls.count}")
         cls.count = 0
 # === Boost Similarity with Skill and Title Matching ===
-def boost_score_with_skills(similarity, resume_text, job_text, skill_map, resume_title, job_title, title_map):
-    breakdown = {
-        "raw_similarity": similarity,
-        "matched_tokens": [],
-        "matched_categories": [],
-        "similarity_score": 0.0,
-        "token_bonus": 0.0,
-        "category_bonus": 0.0,
-        "title_bonus": 0.0,
-        "total_bonus": 0.0,
-        "title_match": False,
-        "normalized_resume_title": resume_title,
-        "normalized_job_title": job_title
-    }
-    similarity_score = similarity if not np.isnan(similarity) else 0.0
-    total_bonus = 0.0
-
-    # Token matching
-    resume_tokens = tokenize_clean(resume_text)
-    job_tokens = tokenize_clean(job_text)
-    token_overlap = resume_tokens & job_tokens
-    token_bonus = 0.0
-    if token_overlap:
-        token_bonus = min(0.02 * len(token_overlap), 0.10)
-        breakdown["matched_tokens"] = sorted(token_overlap)
-
-    # Category matching
-    resume_cats = find_skill_categories_in_text(resume_text, skill_map)
-    job_cats = find_skill_categories_in_text(job_text, skill_map)
-    category_overlap = resume_cats & job_cats
-    category_bonus = 0.0
-    if category_overlap:
-        category_bonus = min(0.05 * len(category_overlap), 0.20)
-        breakdown["matched_categories"] = sorted(category_overlap)
+# resume_tokens/resume_cats/job_tokens may be passed in precomputed when scoring one resume against many jobs
+def boost_score_with_skills(similarity, resume_text, job_text, skill_map, resume_title, job_title, title_map, resume_tokens=None, resume_cats=None, job_tokens=None):
+    final_scores, breakdowns = boost_scores_with_skills(
+        [similarity], resume_text, [job_text], skill_map, resume_title, [job_title], title_map,
+        resume_tokens=resume_tokens, resume_cats=resume_cats, job_token_sets=None if job_tokens is None else [job_tokens])
+    return final_scores[0], breakdowns[0]
+# Batched boost_score_with_skills: overlaps are found per job, the bonus arithmetic runs once over arrays
+def boost_scores_with_skills(similarities, resume_text, job_texts, skill_map, resume_title, job_titles, title_map, resume_tokens=None, resume_cats=None, job_token_sets=None) -> Tuple[List[float], List[dict]]:
+    similarities = np.asarray(similarities, dtype=np.float64)
+    if resume_tokens is None:
+        resume_tokens = tokenize_clean(resume_text)
+    if resume_cats is None:
+        resume_cats = find_skill_categories_in_text(resume_text, skill_map)
+    if job_token_sets is None:
+        job_token_sets = tokenize_clean_many(job_texts)
+    token_overlaps = [resume_tokens & job_tokens for job_tokens in job_token_sets]
+    category_overlaps = [resume_cats & find_skill_categories_in_text(job_text, skill_map) for job_text in job_texts]
 
-    # Title matching
-    title_bonus = 0.0
-    if resume_title and job_title:
-        norm_resume = normalize_title(resume_title, title_map)
-        norm_job = normalize_title(job_title, title_map)
-        breakdown["normalized_resume_title"] = norm_resume
-        breakdown["normalized_job_title"] = norm_job
-        if norm_resume == norm_job:
-            title_bonus = 0.05
-            breakdown["title_match"] = True
+    # Title matching: the resume title is normalized once for all jobs
+    norm_resume = normalize_title(resume_title, title_map) if resume_title else None
+    norm_jobs = [normalize_title(job_title, title_map) if norm_resume is not None and job_title else None for job_title in job_titles]
+    title_matches = np.fromiter((norm_job is not None and norm_job == norm_resume for norm_job in norm_jobs), dtype=bool, count=len(norm_jobs))
 
-    # Calculate total bonus and update breakdown safely
+    # Bonus arithmetic over all jobs at once, in the same order as the per-job formula
+    similarity_scores = np.nan_to_num(similarities, nan=0.0)
+    token_bonus = np.minimum(0.02 * np.fromiter(map(len, token_overlaps), dtype=np.float64, count=len(token_overlaps)), 0.10)
+    category_bonus = np.minimum(0.05 * np.fromiter(map(len, category_overlaps), dtype=np.float64, count=len(category_overlaps)), 0.20)
+    title_bonus = np.where(title_matches, 0.05, 0.0)
     total_bonus = token_bonus + category_bonus + title_bonus
-    breakdown.update({
-        "similarity_score": round(similarity_score * 100, 2),
-        "token_bonus": round(token_bonus * 100, 2),
-        "category_bonus": round(category_bonus * 100, 2),
-        "title_bonus": round(title_bonus * 100, 2),
-        "total_bonus": round(total_bonus * 100, 2)
-    })
-    BoostScoreLogCounter.log_breakdown(breakdown)
-    final_score = min(similarity_score + total_bonus, 1.0)
+    final_scores = np.minimum(similarity_scores + total_bonus, 1.0)
 
-    return final_score, breakdown
+    breakdowns = []
+    columns = zip(similarities.tolist(), token_overlaps, category_overlaps, job_titles, norm_jobs, title_matches.tolist(),
+                  (similarity_scores * 100).tolist(), (token_bonus * 100).tolist(), (category_bonus * 100).tolist(),
+                  (title_bonus * 100).tolist(), (total_bonus * 100).tolist())
+    for raw, tokens, cats, job_title, norm_job, title_match, sim_pct, token_pct, cat_pct, title_pct, total_pct in columns:
+        breakdown = {
+            "raw_similarity": raw,
+            "matched_tokens": sorted(tokens),
+            "matched_categories": sorted(cats),
+            "similarity_score": round(sim_pct, 2),
+            "token_bonus": round(token_pct, 2),
+            "category_bonus": round(cat_pct, 2),
+            "title_bonus": round(title_pct, 2),
+            "total_bonus": round(total_pct, 2),
+            "title_match": title_match,
+            "normalized_resume_title": resume_title if norm_job is None else norm_resume,
+            "normalized_job_title": job_title if norm_job is None else norm_job
+        }
+        BoostScoreLogCounter.log_breakdown(breakdown)
+        breakdowns.append(breakdown)
+    return final_scores.tolist(), breakdowns
 
-# Calculate cosine similarity between resume and job embeddings
+# Cosine of two unit-norm vectors: a single dot product
+def _cosine_prenorm(a: np.ndarray, b: np.ndarray) -> float:
+    return float(a @ b)
+# Calculate cosine similarity between resume and job embeddings, rescaled to [0, 1]
+# (single-pair wrapper; matching scores whole job matrices through _cosine_scores)
 def calculate_similarity(a, b):
     try:
         if a is None or b is None:
             return 0.0
-        a, b = np.array(a), np.array(b)
-        denom = np.linalg.norm(a) * np.linalg.norm(b)
-        if denom == 0:
+        a = np.asarray(a, dtype=np.float32)
+        b = np.asarray(b, dtype=np.float32)
+        norm_a, norm_b = np.linalg.norm(a), np.linalg.norm(b)
+        if norm_a == 0 or norm_b == 0:
             logger.warning("[similarity] Invalid vector norm product (zero); returning 0.0")
             return 0.0
-        similarity = float((np.dot(a, b) / denom + 1) / 2)
+        similarity = (_cosine_prenorm(a / norm_a, b / norm_b) + 1) / 2
         if np.isnan(similarity):
             logger.warning("[similarity] NaN similarity result encountered; returning 0.0")
             return 0.0
@@ -255,22 +436,59 @@ def calculate_similarity(a, b):
     except Exception as e:
         logger.error(f"[similarity] Error: {str(e)}")
         return 0.0
+# Batched calculate_similarity: score one query vector against every row of a matrix
+def _cosine_scores(query, matrix) -> np.ndarray:
+    query = np.asarray(query, dtype=np.float32).ravel()
+    matrix = np.asarray(matrix)
+    scores = np.zeros(len(matrix), dtype=np.float32)
+    if not len(matrix) or not query.any():
+        return scores
+    # Zero vectors (e.g. empty skill sections) keep a score of 0.0, as in calculate_similarity
+    valid = matrix.any(axis=1)
+    rows = matrix[valid]
+    if not len(rows):
+        return scores
+    if simsimd is not None:
+        # int8 rows are scored against an int8 query; cosine ignores the per-vector scales
+        if rows.dtype == np.int8:
+            query = quantize_embeddings(query)[0]
+        cosine = 1.0 - np.asarray(simsimd.cdist(query.reshape(1, -1), rows, metric="cosine"), dtype=np.float32).ravel()
+    else:
+        # Normalize the query once; row norms come from one fused multiply-sum instead of a squared copy
+        rows = rows.astype(np.float32, copy=False)
+        query = query / np.linalg.norm(query)
+        cosine = (rows @ query) / np.sqrt(np.einsum("ij,ij->i", rows, rows))
+    scores[valid] = np.nan_to_num((cosine + 1) / 2, nan=0.0)
+    return scores
+# Indices of the k highest scores, best first: np.argpartition selects them in O(N) and only those k are sorted
+def top_k_indices(scores, k: int) -> np.ndarray:
+    scores = np.asarray(scores)
+    k = min(max(k, 0), len(scores))
+    if k == 0:
+        return np.empty(0, dtype=np.intp)
+    top = np.argpartition(-scores, k - 1)[:k] if k < len(scores) else np.arange(len(scores))
+    return top[np.argsort(-scores[top], kind="stable")]
+# Job objects built from the batch files, reused until a batch is added, removed or rewritten
+_all_jobs_cache = {"signature": None, "jobs": []}
 # Get all jobs from all batches
 def get_all_jobs() -> List[Job]:
     jobs = []
     try:
-        for file in os.listdir(ADZUNA_DATA_DIR):
-            if file.startswith("batch_") and file.endswith(".json"):
-                with open(os.path.join(ADZUNA_DATA_DIR, file), 'r', encoding='utf-8') as f:
-                    for job in json.load(f):
-                        try:
-                            jobs.append(Job(**job))
-                        except Exception as err:
-                            logger.warning(f"[get_all_jobs] Failed to parse job: {err}")
+        entries = batch_entries()
+        signature = batch_signature(entries)
+        if _all_jobs_cache["signature"] == signature:
+            return list(_all_jobs_cache["jobs"])
+        for entry in entries:
+            for job in load_batch(entry):
+                try:
+                    jobs.append(Job(**job))
+                except Exception as err:
+                    logger.warning(f"[get_all_jobs] Failed to parse job: {err}")
         Job.log_ignored_field_summary()
+        _all_jobs_cache.update(signature=signature, jobs=jobs)
     except Exception as e:
         logger.error(f"[get_all_jobs] {e}")
-    return jobs
+    return list(jobs)
 
 # Resolve resume embeddings (narrative + skills) and text   
 def resolve_resume_embeddings(resume_id: str) -> Tuple[Optional[Dict[str, np.ndarray]], Optional[str], Optional[Dict]]:
@@ -283,49 +501,70 @@ def resolve_resume_embeddings(resume_id: str) -> Tuple[Optional[Dict[str, np.nda
       if not resume_text:
           return None, None, {"error": f"Missing resume text for ID {resume_id}"}
 
-      inner = metadata.get("metadata", {}) or metadata
-      emb_narr = inner.get("embedding_narrative")
-      emb_skill = inner.get("embedding_skills")
-
-      if (
-          isinstance(emb_narr, list)
-          and isinstance(emb_skill, list)
-          and len(emb_narr) == 384
-          and len(emb_skill) == 384
-      ):
-          return {
-              "narrative": np.array(emb_narr, dtype=np.float32),
-              "skills": np.array(emb_skill, dtype=np.float32)
-          }, resume_text, None
+      if metadata.get("embedding_file"):
+          stored = get_resume_embeddings(resume_id)
+          if stored:
+              return stored, resume_text, None
 
       # Fall back to regeneration
       logger.info(f"[resolve_resume_embeddings] Regenerating embeddings for resume ID {resume_id}")
-      embeddings = generate_dual_embeddings(resume_text)
-      resume_storage._index["resumes"][resume_id].setdefault("metadata", {})
-      resume_storage._index["resumes"][resume_id]["metadata"]["embedding_narrative"] = embeddings["narrative"].tolist()
-      resume_storage._index["resumes"][resume_id]["metadata"]["embedding_skills"] = embeddings["skills"].tolist()
-      resume_storage._save_index()
+      embeddings = generate_resume_embeddings(resume_text)
+      resume_storage.store_embeddings(resume_id, embeddings)
 
       return embeddings, resume_text, None
   except Exception as e:
       logger.error(f"Error resolving embeddings for resume ID {resume_id}: {str(e)}")
       return None, None, {"error": str(e)}
-# Match jobs to a resume
+# Match jobs to a resume; matches come back in job order (pick the best with top_k_indices)
 def match_jobs_to_resume(embeddings, resume_text, jobs, skill_map, title_map, resume_title) -> List[JobMatch]:
     matches = []
-    for job in jobs:
-        job_text = f"{job.title} {job.company} {job.description} {' '.join(job.skills)}"
-        job_embeds = generate_dual_embeddings(job_text)
-        job.embedding_narrative = job_embeds["narrative"]
-        job.embedding_skills = job_embeds["skills"]
-        sim_narr = calculate_similarity(embeddings["narrative"], job.embedding_narrative)
-        sim_skill = calculate_similarity(embeddings["skills"], job.embedding_skills)
-        raw_similarity = (sim_narr + sim_skill) / 2
-        final_score, breakdown = boost_score_with_skills(
-            raw_similarity, resume_text, job_text, skill_map, resume_title, job.title, title_map)
-        matches.append(JobMatch(job, final_score, breakdown))
+    if not jobs:
+        return matches
+    job_texts = [f"{job.title} {job.company} {job.description} {' '.join(job.skills)}" for job in jobs]
+    # Jobs are scored on int8-quantized embeddings, the same representation the store keeps on disk
+    narrative = np.empty((len(jobs), EMBEDDING_DIM), dtype=np.int8)
+    skills = np.empty((len(jobs), EMBEDDING_DIM), dtype=np.int8)
+    # Reuse persisted job embeddings, keyed by a hash of the embedded text; only embed texts the store has not seen
+    keys = [job_embedding_key(text) for text in job_texts]
+    rows = job_embedding_store.get_rows(keys)
+    hits = [i for i, row in enumerate(rows) if row is not None]
+    missing = [i for i, row in enumerate(rows) if row is None]
+    if hits:
+        stored = job_embedding_store.matrix[[rows[i] for i in hits]]
+        narrative[hits] = stored[:, 0]
+        skills[hits] = stored[:, 1]
+    if missing:
+        generated_narrative, generated_skills = generate_dual_embeddings_batch([job_texts[i] for i in missing])
+        narrative[missing] = quantize_embeddings(generated_narrative)[0]
+        skills[missing] = quantize_embeddings(generated_skills)[0]
+        # Texts too short to embed give all-zero rows; those are not worth persisting
+        stored_rows = [j for j in range(len(missing)) if generated_narrative[j].any() or generated_skills[j].any()]
+        if stored_rows:
+            job_embedding_store.add([keys[missing[j]] for j in stored_rows], generated_narrative[stored_rows], generated_skills[stored_rows])
+    logger.debug(f"[match_jobs_to_resume] Job embeddings: {len(hits)} stored, {len(missing)} generated")
+    sim_narr = _cosine_scores(embeddings["narrative"], narrative)
+    sim_skill = _cosine_scores(embeddings["skills"], skills)
+    raw_similarities = (sim_narr + sim_skill) / 2
+    final_scores, breakdowns = boost_scores_with_skills(
+        raw_similarities, resume_text, job_texts, skill_map, resume_title, [job.title for job in jobs], title_map)
+    matches = [JobMatch(job, final_score, breakdown) for job, final_score, breakdown in zip(jobs, final_scores, breakdowns)]
     BoostScoreLogCounter.log_summary()
-    return sorted(matches, key=lambda m: m.similarity_score, reverse=True)
+    return matches
+# Parsed match cache files keyed by path: (st_mtime_ns, url -> JobMatch, raw JSON entries)
+_match_cache_files: Dict[str, Tuple[int, Dict[str, "JobMatch"], dict]] = {}
+# Load a resume's match cache, parsing the file only when it changed since the last call
+def _load_match_cache(cache_file: str) -> Tuple[Dict[str, "JobMatch"], dict]:
+    mtime = os.stat(cache_file).st_mtime_ns
+    memo = _match_cache_files.get(cache_file)
+    if memo and memo[0] == mtime:
+        return dict(memo[1]), memo[2]
+    raw = read_json(cache_file)
+    cached = {
+        url: JobMatch(Job(**data['job']), data['similarity_score'], data.get('breakdown', {}))
+        for url, data in raw.items()
+    }
+    _match_cache_files[cache_file] = (mtime, cached, raw)
+    return dict(cached), raw
 # Match jobs to resume and cache results to avoid recomputation in future runs
 def match_and_cache_jobs(jobs: List[Job], resume_id: str, resume_text: str) -> Dict[str, JobMatch]:
     logger.info(f"🟢 Starting job match and caching for resume {resume_id}")
@@ -334,17 +573,14 @@ def match_and_cache_jobs(jobs: List[Job], resume_id: str, resume_text: str) -> D
 
     # Try to load cache
     cached = {}
+    raw = {}
     if os.path.exists(cache_file):
         try:
-            with open(cache_file, 'r', encoding='utf-8') as f:
-                raw = json.load(f)
-                cached = {
-                    url: JobMatch(Job(**data['job']), data['similarity_score'], data.get('breakdown', {}))
-                    for url, data in raw.items()
-                }
+            cached, raw = _load_match_cache(cache_file)
             logger.info(f"📂 Loaded cache with {len(cached)} entries for resume {resume_id}")
         except Exception as e:
             logger.warning(f"⚠️ Failed to load cache for resume {resume_id}: {e}")
+            cached, raw = {}, {}
 
     # Only calculate matches for uncached jobs
     cached_urls = set(cached.keys())
@@ -371,11 +607,18 @@ def match_and_cache_jobs(jobs: List[Job], resume_id: str, resume_text: str) -> D
     title_map = load_title_map()
     resume_title = extract_resume_title(resume_text)
 
-    new_matches = match_jobs_to_resume(
-        embeddings, resume_text, new_jobs, skill_map, title_map, resume_title
-    )
+    try:
+        new_matches = match_jobs_to_resume(
+            embeddings, resume_text, new_jobs, skill_map, title_map, resume_title
+        )
+    except Exception as e:
+        # Nothing is cached for the failed jobs, so they are matched again on the next request
+        logger.error(f"❌ Failed to match new jobs for resume {resume_id}: {e}")
+        return cached
 
-    for i, match in enumerate(new_matches[:10]):
+    # Only the ten best are logged, so they are selected with argpartition instead of sorting every match
+    scores = np.fromiter((match.similarity_score for match in new_matches), dtype=np.float64, count=len(new_matches))
+    for match in (new_matches[i] for i in top_k_indices(scores, 10)):
         logger.debug(f"📝 Cached: {match.job.title} ({match.job.url}) [{int(match.similarity_score * 100)}%]")
 
     for match in new_matches:
@@ -383,18 +626,13 @@ def match_and_cache_jobs(jobs: List[Job], resume_id: str, resume_text: str) -> D
 
     logger.info(f"📦 Cached {len(new_matches)} new matches (Total: {len(cached)}) for resume {resume_id}")
 
-    # Save updated cache
+    # Save updated cache (entries loaded from disk are written back as-is; only new matches are serialized)
     try:
-        serializable = {
-            url: {
-                "job": match.job.to_dict(),
-                "similarity_score": match.similarity_score,
-                "breakdown": match.breakdown
-            }
-            for url, match in cached.items()
-        }
-        with open(cache_file, 'w', encoding='utf-8') as f:
-            json.dump(serializable, f, indent=2)
+        serializable = dict(raw)
+        serializable.update((match.job.url, match.to_dict()) for match in new_matches)
+        write_json(cache_file, serializable)
+        # The file just written is already parsed; remember it so the next request skips the read
+        _match_cache_files[cache_file] = (os.stat(cache_file).st_mtime_ns, dict(cached), serializable)
         logger.info("💾 Match cache saved successfully")
     except Exception as e:
         logger.error(f"❌ Failed to save cache: {e}")
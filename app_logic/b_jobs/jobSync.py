@@ -5,16 +5,28 @@ import uuid
 import time
 import logging
 import random
-from datetime import datetime, timedelta
+import threading
+from functools import wraps
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
 from typing import List, Dict, Optional, Any, Tuple
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from flask import Blueprint, request, jsonify, session
 from logging.handlers import RotatingFileHandler
+from app_logic.b_jobs.jobBatches import batch_entries, dumps_json, load_batch, read_json, recent_iso_dates, write_json
 # === Adzuna API Constants ===
 PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
 ADZUNA_DATA_DIR = os.path.join(PROJECT_ROOT, 'static', 'job_data', 'adzuna')
 ADZUNA_INDEX_FILE = os.path.join(ADZUNA_DATA_DIR, 'index.json')
 ADZUNA_API_BASE_URL = "https://api.adzuna.com/v1/api"
+# Adzuna allows 20 calls per minute. A bucket holding ADZUNA_BURST_CALLS tokens that refills at
+# (calls - burst) / period never exceeds that quota in any window of ADZUNA_RATE_LIMIT_PERIOD seconds
+ADZUNA_RATE_LIMIT_CALLS = 20
+ADZUNA_RATE_LIMIT_PERIOD = 60.0
+ADZUNA_BURST_CALLS = 5
+ADZUNA_PAGE_FETCH_WORKERS = 4
 logger = logging.getLogger("job_sync")
 # Setup logging
 log_file_path = os.path.join(PROJECT_ROOT, "job_sync.log")
@@ -24,16 +36,28 @@ file_handler.setLevel(logging.INFO)
 logger.addHandler(file_handler)
 job_sync_bp = Blueprint('job_sync', __name__, url_prefix='/api/jobs')
 # === Adzuna API Utilities ===
+# Shared keep-alive session: page fetches reuse pooled TLS connections instead of reconnecting per call
+_adzuna_session = requests.Session()
+_adzuna_session.mount("https://", HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=ADZUNA_PAGE_FETCH_WORKERS * 2,
+    max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=(502, 503, 504), allowed_methods=frozenset(["GET"]))
+))
 # Custom exception for Adzuna API errors
 class AdzunaAPIError(Exception):
     pass
-# Get Adzuna API credentials from environment variables
+# Get Adzuna API credentials from environment variables (remembered once both are present)
+_api_credentials: Optional[Tuple[str, str]] = None
 def get_api_credentials():
+    global _api_credentials
+    if _api_credentials is not None:
+        return _api_credentials
     app_id = os.environ.get('ADZUNA_APP_ID')
     api_key = os.environ.get('ADZUNA_API_KEY')
     if not app_id or not api_key:
         raise AdzunaAPIError("Missing Adzuna API credentials in environment variables")
-    return app_id, api_key
+    _api_credentials = (app_id, api_key)
+    return _api_credentials
 # === Job Model for Adzuna Sync ===
 class Job:
     """Class representing a job listing (self-contained in jobSync.py)"""
@@ -121,7 +145,7 @@ def search_jobs(
     if permanent is not None:
         params["permanent"] = int(permanent)
     try:
-        response = requests.get(url, params=params, timeout=30)
+        response = _adzuna_session.get(url, params=params, timeout=30)
         if response.status_code != 200:
             raise AdzunaAPIError(f"Adzuna API error: {response.status_code} - {response.text}")
         data = response.json()
@@ -132,9 +156,35 @@ def search_jobs(
         raise AdzunaAPIError("Adzuna API request timed out")
     except requests.exceptions.RequestException as e:
         raise AdzunaAPIError(f"Request error: {str(e)}")
+# Token bucket shared by every Adzuna call in this process
+class TokenBucket:
+    def __init__(self, capacity: float, refill_rate: float):
+        self.capacity = capacity
+        self.refill_rate = refill_rate
+        self._tokens = capacity
+        self._last_refill = time.monotonic()
+        self._lock = threading.Lock()
+    # Take one token, blocking only while the bucket is empty
+    def consume(self) -> None:
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._last_refill) * self.refill_rate)
+                self._last_refill = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.refill_rate
+            time.sleep(wait)
+adzuna_rate_limiter = TokenBucket(
+    capacity=ADZUNA_BURST_CALLS,
+    refill_rate=(ADZUNA_RATE_LIMIT_CALLS - ADZUNA_BURST_CALLS) / ADZUNA_RATE_LIMIT_PERIOD
+)
 # Processes the raw Adzuna API response and converts it to a list of Job objects.
 def parse_adzuna_results(data: Dict, page: int) -> List[Job]:
     results = []
+    # One fallback timestamp for the whole page instead of one datetime.now() per result
+    fetched_at = datetime.now().isoformat()
     for item in data.get("results", []):
         try:
             job = Job(
@@ -142,7 +192,7 @@ def parse_adzuna_results(data: Dict, page: int) -> List[Job]:
                 company=item.get("company", {}).get("display_name", "Unknown Company"),
                 description=item.get("description", ""),
                 location=item.get("location", {}).get("display_name", ""),
-                posted_date=item.get("created", datetime.now().isoformat()),
+                posted_date=item.get("created", fetched_at),
                 url=item.get("redirect_url", ""),
                 skills=[],
                 salary_range=format_salary(item.get("salary_min"), item.get("salary_max"))
@@ -161,19 +211,26 @@ def format_salary(min_salary, max_salary):
         return f"Up to ${max_salary:,.0f}"
     return None
 # === Index and Batch Handling ===
+# URLs of every job already stored in a batch file, gathered in one pass for dedupe
+def _stored_job_urls() -> set:
+    urls = set()
+    for entry in batch_entries():
+        try:
+            urls.update(job["url"] for job in load_batch(entry) if isinstance(job, dict) and job.get("url"))
+        except Exception as e:
+            logger.warning(f"Skipping unreadable batch {entry.name} during dedupe: {str(e)}")
+    return urls
 def _load_index() -> Dict:
     if os.path.exists(ADZUNA_INDEX_FILE):
         try:
-            with open(ADZUNA_INDEX_FILE, 'r', encoding='utf-8') as f:
-                return json.load(f)
+            return read_json(ADZUNA_INDEX_FILE)
         except Exception as e:
             logger.error(f"Failed to load index: {str(e)}")
     return {"batches": {}, "job_count": 0, "last_sync": None, "last_batch": None}
 # 
 def _save_index(index: Dict) -> None:
     try:
-        with open(ADZUNA_INDEX_FILE, 'w', encoding='utf-8') as f:
-            json.dump(index, f, indent=2)
+        write_json(ADZUNA_INDEX_FILE, index, indent=False)
     except Exception as e:
         logger.error(f"Failed to save index: {str(e)}")
 #
@@ -181,8 +238,8 @@ def _save_batch(jobs: List[Dict], batch_id: str) -> bool:
     try:
         os.makedirs(ADZUNA_DATA_DIR, exist_ok=True)
         batch_file = os.path.join(ADZUNA_DATA_DIR, f"batch_{batch_id}.json")
-        with open(batch_file, 'w', encoding='utf-8') as f:
-            json.dump(jobs, f, indent=2)
+        with open(batch_file, 'wb') as f:
+            f.write(dumps_json(jobs))
         return True
     except Exception as e:
         logger.error(f"Failed to save batch {batch_id}: {str(e)}")
@@ -191,18 +248,14 @@ def _save_batch(jobs: List[Dict], batch_id: str) -> bool:
 # 
 def _load_demo_jobs(count=8) -> List[Dict]:
     jobs = []
+    recent_dates = recent_iso_dates(9)
     try:
-        for filename in os.listdir(ADZUNA_DATA_DIR):
-            if filename.startswith("batch_") and filename.endswith(".json"):
-                with open(os.path.join(ADZUNA_DATA_DIR, filename), "r", encoding="utf-8") as f:
-                    data = json.load(f)
-                    for job in data:
-                        job_copy = job.copy()
-                        job_copy["posted_date"] = (
-                            datetime.now() - timedelta(days=random.randint(0, 9))
-                        ).isoformat()
-                        job_copy["match_percentage"] = random.choice([65, 70, 75, 80, 85, 90])
-                        jobs.append(job_copy)
+        for entry in batch_entries():
+            for job in load_batch(entry):
+                job_copy = job.copy()
+                job_copy["posted_date"] = random.choice(recent_dates)
+                job_copy["match_percentage"] = random.choice([65, 70, 75, 80, 85, 90])
+                jobs.append(job_copy)
         random.shuffle(jobs)
         return jobs[:count]
     except Exception as e:
@@ -237,53 +290,64 @@ def sync_jobs_from_adzuna(
     logger.info(f"🔍 Starting job sync: location={location}, keywords={keywords}")
 
     # === Prepare deduplication ===
-    dedupe_index = set()
     index = _load_index()
-    for batch in index.get("batches", {}).values():
-        for job in batch.get("jobs", []):
-            if isinstance(job, dict) and "url" in job:
-                dedupe_index.add(job["url"])
+    dedupe_index = _stored_job_urls()
+    duplicates = 0
 
     # === Begin sync ===
-    page = 1
+    pages_fetched = 0
     total_fetched = 0
     all_jobs: List[Job] = []
     seen_urls = set()
-    total_pages = 1
     start_time = time.time()
 
-    while page <= total_pages and (max_pages is None or page <= max_pages):
-        try:
-            result, total_pages = search_jobs(
-                keywords=keywords,
-                location=location,
-                country=country,
-                page=page,
-                max_days_old=max_days_old,
-                results_per_page=50,
-                category=category
-            )
-            logger.info(f"📄 Fetched page {page}/{total_pages}, jobs returned: {len(result)}")
-            page += 1
-            total_fetched += len(result)
+    def fetch_page(page: int) -> Tuple[List[Job], int]:
+        adzuna_rate_limiter.consume()
+        return search_jobs(
+            keywords=keywords,
+            location=location,
+            country=country,
+            page=page,
+            max_days_old=max_days_old,
+            results_per_page=50,
+            category=category
+        )
 
-            for job in result:
-                if job.url in dedupe_index or job.url in seen_urls:
-                    continue
-                seen_urls.add(job.url)
-                job.matched_keywords = []  # Retained for structure compatibility
-                all_jobs.append(job)
+    # Page 1 reports the page count; the remaining pages are fetched concurrently and consumed in order
+    with ThreadPoolExecutor(max_workers=ADZUNA_PAGE_FETCH_WORKERS, thread_name_prefix="adzuna_page") as pool:
+        pending = {1: pool.submit(fetch_page, 1)} if max_pages is None or max_pages >= 1 else {}
+        page = 1
+        while page in pending:
+            try:
+                result, total_pages = pending.pop(page).result()
+                logger.info(f"📄 Fetched page {page}/{total_pages}, jobs returned: {len(result)}")
+                pages_fetched += 1
+                total_fetched += len(result)
 
-            time.sleep(3)
-        except AdzunaAPIError as e:
-            logger.error(f"Adzuna error: {str(e)}")
-            break
-        except Exception as e:
-            logger.error(f"Unexpected error on page {page}: {str(e)}")
-            break
+                for job in result:
+                    if job.url in dedupe_index or job.url in seen_urls:
+                        duplicates += 1
+                        continue
+                    seen_urls.add(job.url)
+                    job.matched_keywords = []  # Retained for structure compatibility
+                    all_jobs.append(job)
+
+                if page == 1:
+                    last_page = total_pages if max_pages is None else min(total_pages, max_pages)
+                    pending.update((n, pool.submit(fetch_page, n)) for n in range(2, last_page + 1))
+                page += 1
+            except AdzunaAPIError as e:
+                logger.error(f"Adzuna error: {str(e)}")
+                break
+            except Exception as e:
+                logger.error(f"Unexpected error on page {page}: {str(e)}")
+                break
+        # Pages after a failed one are dropped, as the sequential loop did
+        for future in pending.values():
+            future.cancel()
 
     if not all_jobs:
-        logger.warning("❌ No new jobs retrieved from Adzuna.")
+        logger.warning(f"❌ No new jobs retrieved from Adzuna ({duplicates} duplicates skipped).")
         return {"status": "error", "error": "No new jobs retrieved from Adzuna"}
 
     job_dicts = []
@@ -308,123 +372,189 @@ def sync_jobs_from_adzuna(
         "country": country,
         "job_count": len(job_dicts),
         "max_days_old": max_days_old,
-        "match_summary": {},  # Empty since filtering is removed
-        "jobs": job_dicts
+        "match_summary": {}  # Empty since filtering is removed
     }
     index["job_count"] += len(job_dicts)
     index["last_sync"] = datetime.now().isoformat()
     index["last_batch"] = batch_id
     _save_index(index)
 
-    logger.info(f"✅ Sync complete: {len(job_dicts)} new jobs kept (fetched {total_fetched} total) in {round(time.time() - start_time, 2)}s")
+    logger.info(f"✅ Sync complete: {len(job_dicts)} new jobs kept, {duplicates} duplicates skipped (fetched {total_fetched} total) in {round(time.time() - start_time, 2)}s")
     logger.info(f"🗂️ Batch ID: {batch_id}")
 
     return {
         "status": "success",
-        "pages_fetched": page - 1,
+        "pages_fetched": pages_fetched,
         "total_jobs": len(job_dicts),
+        "duplicates": duplicates,
         "batch_id": batch_id,
         "time_taken_seconds": round(time.time() - start_time, 2),
         "match_summary": {}
     }
 
+# === Background Sync Tasks ===
+# A single worker serializes syncs so concurrent requests never share the Adzuna quota
+_SYNC_EXECUTOR = ThreadPoolExecutor(max_workers=1, thread_name_prefix="job_sync")
+_SYNC_TASKS: Dict[str, Dict[str, Any]] = {}
+_SYNC_TASKS_LOCK = threading.Lock()
+MAX_TRACKED_SYNC_TASKS = 50
+# Run sync_jobs_from_adzuna on the executor and record its outcome
+def _run_sync_task(task_id: str, sync_kwargs: Dict[str, Any]) -> None:
+    with _SYNC_TASKS_LOCK:
+        _SYNC_TASKS[task_id]["state"] = "running"
+    try:
+        results = sync_jobs_from_adzuna(**sync_kwargs)
+    except Exception as e:
+        logger.error(f"Background sync {task_id} failed: {str(e)}")
+        results = {"status": "error", "error": str(e)}
+    with _SYNC_TASKS_LOCK:
+        _SYNC_TASKS[task_id].update({
+            "state": "done",
+            "finished": datetime.now().isoformat(),
+            "results": results
+        })
+# ID of the sync that is queued or running, if any
+def _active_sync_task_id() -> Optional[str]:
+    with _SYNC_TASKS_LOCK:
+        return next((tid for tid, task in _SYNC_TASKS.items() if task["state"] != "done"), None)
+# Queue a sync and return its task ID for polling, or None while another sync is still in flight
+def start_sync_task(**sync_kwargs) -> Optional[str]:
+    task_id = str(uuid.uuid4())
+    with _SYNC_TASKS_LOCK:
+        # Concurrent syncs would only queue behind each other and drain the same Adzuna quota
+        if any(task["state"] != "done" for task in _SYNC_TASKS.values()):
+            return None
+        # Forget the oldest finished tasks so the registry stays bounded
+        finished = [tid for tid, task in _SYNC_TASKS.items() if task["state"] == "done"]
+        for tid in finished[:max(0, len(_SYNC_TASKS) - MAX_TRACKED_SYNC_TASKS + 1)]:
+            del _SYNC_TASKS[tid]
+        _SYNC_TASKS[task_id] = {"id": task_id, "state": "pending", "submitted": datetime.now().isoformat()}
+    _SYNC_EXECUTOR.submit(_run_sync_task, task_id, sync_kwargs)
+    logger.info(f"Queued background sync {task_id}")
+    return task_id
+# Build the JSON response for a finished sync
+def _sync_results_response(results: Dict[str, Any], **extra):
+    if results.get('status') != 'success':
+        return jsonify({
+            "success": False,
+            "error": results.get("error", "Unknown error during sync"),
+            **extra
+        }), 500
+
+    return jsonify({
+        "success": True,
+        "results": results,
+        "message": f"Successfully synced {results.get('total_jobs', 0)} jobs " +
+                   f"across {results.get('pages_fetched', 0)} pages",
+        **extra
+    })
+
+# === Route Helpers ===
+# """Reject non-JSON bodies and turn uncaught exceptions into a JSON 500; error_message replaces str(e) as the public error"""
+def _json_route(error_message: Optional[str] = None):
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not request.is_json:
+                return jsonify({"success": False, "error": "Request must be JSON"}), 400
+            try:
+                return fn(*args, **kwargs)
+            except Exception as e:
+                logger.error(f"❌ Unexpected error in {fn.__name__}: {str(e)}")
+                if error_message:
+                    return jsonify({"success": False, "error": error_message, "details": str(e)}), 500
+                return jsonify({"success": False, "error": str(e)}), 500
+        return wrapper
+    return decorator
 # === API Endpoint Sync Route ===
 @job_sync_bp.route('/sync', methods=['POST'])
+@_json_route()
 def sync_jobs_api():
-    if not request.is_json:
-        return jsonify({"success": False, "error": "Request must be JSON"}), 400
-
-    try:
-        data = request.get_json()
-        logger.debug(f"Received sync request payload: {json.dumps(data, indent=2)}")
-        raw_keywords = data.get('keywords', '')
-        keywords_list = data.get('keywords_list', [])
-        # Start with any typed-in single keywords
-        if raw_keywords:
-            keywords_list.append(raw_keywords)
-        # Clean and deduplicate all keywords
-        keywords_list = list(set(filter(None, [kw.strip() for kw in keywords_list])))
-        location = data.get('location', '')
-        country = data.get('country', 'us')
-        max_pages = data.get('max_pages', None)
-        max_days_old = data.get('max_days_old', 1)
-        category = data.get('category', None)
-        # Check if demo mode is enabled to load demo jobs instead of real sync
-        if session.get("demo", False):
-            # Simulate demo job sync
-            jobs = _load_demo_jobs(count=random.randint(6, 9))
-            results = {
-                "status": "success",
-                "pages_fetched": 1,
-                "total_jobs": len(jobs),
-                "batch_id": "demo-mode",
-                "time_taken_seconds": round(random.uniform(1.0, 2.5), 2),
-                "match_summary": {kw: random.randint(1, 3) for kw in keywords_list}
-            }
-        else:
-            results = sync_jobs_from_adzuna(
-                keywords=keywords_list,
-                location=location,
-                country=country,
-                max_pages=max_pages,
-                max_days_old=max_days_old,
-                category=category
-            )
-        if results.get('status') != 'success':
-            return jsonify({
-                "success": False,
-                "error": results.get("error", "Unknown error during sync")
-            }), 500
+    data = request.get_json()
+    logger.debug(f"Received sync request payload: {json.dumps(data, indent=2)}")
+    raw_keywords = data.get('keywords', '')
+    keywords_list = data.get('keywords_list', [])
+    # Start with any typed-in single keywords
+    if raw_keywords:
+        keywords_list.append(raw_keywords)
+    # Clean and deduplicate all keywords
+    keywords_list = list(set(filter(None, [kw.strip() for kw in keywords_list])))
+    location = data.get('location', '')
+    country = data.get('country', 'us')
+    max_pages = data.get('max_pages', None)
+    max_days_old = data.get('max_days_old', 1)
+    category = data.get('category', None)
+    # Check if demo mode is enabled to load demo jobs instead of real sync
+    if session.get("demo", False):
+        # Simulate demo job sync
+        jobs = _load_demo_jobs(count=random.randint(6, 9))
+        results = {
+            "status": "success",
+            "pages_fetched": 1,
+            "total_jobs": len(jobs),
+            "batch_id": "demo-mode",
+            "time_taken_seconds": round(random.uniform(1.0, 2.5), 2),
+            "match_summary": {kw: random.randint(1, 3) for kw in keywords_list}
+        }
+        return _sync_results_response(results)
 
-        return jsonify({
-            "success": True,
-            "results": results,
-            "message": f"Successfully synced {results.get('total_jobs', 0)} jobs " +
-                       f"across {results.get('pages_fetched', 0)} pages"
+    # Real syncs page through Adzuna for minutes; run them off the request thread
+    task_id = start_sync_task(
+        keywords=keywords_list,
+        location=location,
+        country=country,
+        max_pages=max_pages,
+        max_days_old=max_days_old,
+        category=category
+    )
+    if task_id is None:
+        response = jsonify({
+            "success": False,
+            "error": "A job sync is already in progress",
+            "task_id": _active_sync_task_id()
         })
-
-    except Exception as e:
-        logger.error(f"Unexpected sync error: {str(e)}")
-        return jsonify({"success": False, "error": str(e)}), 500
+        response.headers["Retry-After"] = "10"
+        return response, 429
+    return jsonify({
+        "success": True,
+        "task_id": task_id,
+        "message": "Sync started"
+    }), 202
+# API endpoint to poll a background sync started by /sync
+@job_sync_bp.route('/sync/status/<task_id>', methods=['GET'])
+def sync_status_api(task_id):
+    with _SYNC_TASKS_LOCK:
+        task = dict(_SYNC_TASKS.get(task_id) or {})
+    if not task:
+        return jsonify({"success": False, "error": f"Unknown sync task '{task_id}'"}), 404
+    if task["state"] != "done":
+        return jsonify({"success": True, "task_id": task_id, "state": task["state"]})
+    return _sync_results_response(task["results"], task_id=task_id, state="done")
 # API endpoint to save keyword list persistently in index.json
 @job_sync_bp.route('/save_keywords_list', methods=['POST'])
+@_json_route(error_message="Exception while saving keyword list")
 def save_keywords_list():
-    if not request.is_json:
-        return jsonify({"success": False, "error": "Request must be JSON"}), 400
-
+    data = request.get_json()
+    keywords_list = data.get('keywords_list', [])
     # ✅ Check for demo mode BEFORE modifying the index
     if session.get("demo", False):
-        data = request.get_json()
-        keywords_list = data.get("keywords_list", [])
         return jsonify({
             "success": True,
             "message": "Settings saved (demo mode only, will reset after session).",
             "count": len(keywords_list)
         })
 
-    try:
-        data = request.get_json()
-        keywords_list = data.get('keywords_list', [])
-
-        if not isinstance(keywords_list, list):
-            return jsonify({"success": False, "error": "Invalid keyword list"}), 400
-
-        index = _load_index()
-        index["saved_keywords"] = list(set(filter(None, [kw.strip() for kw in keywords_list])))
-        _save_index(index)
+    if not isinstance(keywords_list, list):
+        return jsonify({"success": False, "error": "Invalid keyword list"}), 400
 
-        logger.info(f"✅ Saved keyword list with {len(index['saved_keywords'])} keywords to index")
-        return jsonify({
-            "success": True,
-            "message": "Keywords list saved successfully",
-            "count": len(index["saved_keywords"])
-        })
+    index = _load_index()
+    index["saved_keywords"] = list(set(filter(None, [kw.strip() for kw in keywords_list])))
+    _save_index(index)
 
-    except Exception as e:
-        logger.error(f"❌ Error saving keywords list: {str(e)}")
-        return jsonify({
-            "success": False,
-            "error": "Exception while saving keyword list",
-            "details": str(e)
-        }), 500
+    logger.info(f"✅ Saved keyword list with {len(index['saved_keywords'])} keywords to index")
+    return jsonify({
+        "success": True,
+        "message": "Keywords list saved successfully",
+        "count": len(index["saved_keywords"])
+    })
 
@@ -1,37 +1,29 @@
 # demoMode.py - Generates fake job entries using real historical data
-import os
-import json
 import random
-from datetime import datetime, timedelta
-from app_logic.b_jobs.jobLayout import ADZUNA_DATA_DIR
+from app_logic.b_jobs.jobBatches import batch_entries, load_batch, recent_iso_dates
 
 def _load_all_jobs_from_batches(max_count=32):
     jobs = []
-    for filename in os.listdir(ADZUNA_DATA_DIR):
-        if filename.startswith("batch_") and filename.endswith(".json"):
-            path = os.path.join(ADZUNA_DATA_DIR, filename)
-            with open(path, "r", encoding="utf-8") as f:
-                try:
-                    data = json.load(f)
-                    for job in data:
-                        if "title" in job and "company" in job:
-                            jobs.append(job)
-                            if len(jobs) >= max_count:
-                                return jobs
-                except Exception:
-                    continue
+    for entry in batch_entries():
+        try:
+            data = load_batch(entry)
+        except Exception:
+            continue
+        for job in data:
+            if "title" in job and "company" in job:
+                jobs.append(job)
+                if len(jobs) >= max_count:
+                    return jobs
     return jobs
 
-def _random_date_within(days: int) -> str:
-    return (datetime.now() - timedelta(days=random.randint(0, days))).isoformat()
-
 def get_demo_jobs(initial=True):
     raw_jobs = _load_all_jobs_from_batches()
     count = 25 if initial else 7
     demo_jobs = []
+    recent_dates = recent_iso_dates(10 if initial else 1)
     for job in raw_jobs[:count]:
         demo = job.copy()
-        demo["posted_date"] = _random_date_within(10 if initial else 1)
+        demo["posted_date"] = random.choice(recent_dates)
         demo["match_percentage"] = random.choice([60, 70, 80, 90])
         demo_jobs.append(demo)
     return demo_jobs
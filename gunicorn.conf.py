@@ -0,0 +1,11 @@
+# gunicorn.conf.py - Picked up automatically by `gunicorn main:app` from the project root
+import os
+
+# One process keeps the sync task registry, the Adzuna rate limiter and the in-memory caches shared;
+# threads let status polls and page loads proceed while a request waits on I/O
+worker_class = "gthread"
+workers = int(os.environ.get("WEB_CONCURRENCY", "1"))
+threads = int(os.environ.get("GUNICORN_THREADS", "8"))
+# Matching a fresh batch embeds every new job on the request thread
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", "120"))
+keepalive = 5
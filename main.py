@@ -1,11 +1,14 @@
 # main.py - Main application file for job matching application
 import os
 import logging
+from jinja2 import FileSystemBytecodeCache
 from flask import Flask, render_template, session
+from flask.json.provider import DefaultJSONProvider
+import orjson
 from app_logic.b_jobs.jobLayout import generate_table_context
 from app_logic.a_resume.uploadResume import upload_resume_bp
 from app_logic.a_resume.resumeHistory import resume_history_bp
-from app_logic.a_resume.resumeHistory import get_all_resumes
+from app_logic.a_resume.resumeHistory import get_all_resumes, generate_demo_resumes
 from app_logic.b_jobs.jobLayout import layout_bp
 from app_logic.b_jobs.jobSync import job_sync_bp
 from app_logic.c_user.userLogin import user_login_bp
@@ -21,9 +24,47 @@ logging.basicConfig(
     level=logging.DEBUG,
     format="%(asctime)s %(levelname)s-%(name)s: [%(funcName)s] %(message)s")
 logger = logging.getLogger(__name__)
+# === JSON Provider ===
+# """Serialize responses with orjson (numpy arrays included), falling back to the stdlib encoder"""
+class ORJSONProvider(DefaultJSONProvider):
+    def _dumps_bytes(self, obj, sort_keys: bool) -> bytes:
+        option = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NAIVE_UTC | orjson.OPT_NON_STR_KEYS
+        if sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        return orjson.dumps(obj, default=self.default, option=option)
+    def dumps(self, obj, **kwargs) -> str:
+        # Jinja's tojson filter passes sort_keys; any other stdlib option goes to the default encoder
+        sort_keys = kwargs.pop("sort_keys", self.sort_keys)
+        if kwargs:
+            return super().dumps(obj, sort_keys=sort_keys, **kwargs)
+        try:
+            return self._dumps_bytes(obj, sort_keys).decode("utf-8")
+        except TypeError:
+            return super().dumps(obj, sort_keys=sort_keys)
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        try:
+            body = self._dumps_bytes(obj, self.sort_keys)
+        except TypeError:
+            return super().response(*args, **kwargs)
+        return self._app.response_class(body, mimetype=self.mimetype)
+    def loads(self, s, **kwargs):
+        # request.get_json hands over the raw body bytes; orjson parses them without a decode step
+        if kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
 # Initialize Flask app
 app = Flask(__name__)
+app.json = ORJSONProvider(app)
 app.secret_key = os.environ.get("SESSION_SECRET", "dev_secret_key")
+# Let the front-end server (nginx X-Accel-Redirect / Apache mod_xsendfile) stream static files, stored resumes included
+app.use_x_sendfile = os.environ.get("USE_X_SENDFILE", "0") == "1"
+# Outside debug mode, keep compiled templates: no staleness checks, bytecode cached across worker restarts
+if not app.debug:
+    app.jinja_env.auto_reload = False
+    app.jinja_env.cache_size = 400
+    # No directory argument: Jinja uses a per-user 0700 directory and verifies its owner
+    app.jinja_env.bytecode_cache = FileSystemBytecodeCache()
 app.register_blueprint(upload_resume_bp)
 app.register_blueprint(resume_history_bp)
 app.register_blueprint(layout_bp)
@@ -37,7 +78,6 @@ def index():
 
     # ✅ Use real or demo resumes
     if is_demo:
-        from app_logic.a_resume.resumeHistory import generate_demo_resumes
         resumes = generate_demo_resumes()
     else:
         resumes = get_all_resumes(user_id=session.get("user_id"))
@@ -49,3 +89,6 @@ def index():
     return render_template("index.html", **context)
 
 
+# Development server only; deployments run gunicorn with gunicorn.conf.py
+if __name__ == "__main__":
+    app.run(host="0.0.0.0", port=int(os.environ.get("PORT", "5000")), debug=os.environ.get("FLASK_DEBUG") == "1", threaded=True)
@@ -149,7 +149,37 @@ function syncJobs() {
     contentType: 'application/json',
     data: JSON.stringify(payload),
     success: (res) => {
-      if (res.success) {
+      if (res.success && res.task_id) {
+        pollSyncStatus(res.task_id);
+      } else if (res.success) {
+        showStatus("Sync complete. Reloading...", "success");
+        setTimeout(() => location.reload(), 3000);
+      } else {
+        showStatus(`Error: ${res.error}`, "danger");
+      }
+    },
+    error: (xhr) => {
+      // A sync started elsewhere is still running; follow it instead of failing
+      if (xhr.status === 429 && xhr.responseJSON?.task_id) {
+        pollSyncStatus(xhr.responseJSON.task_id);
+        return;
+      }
+      const msg = xhr.responseJSON?.error || xhr.statusText || 'Unknown error';
+      showStatus(`Error: ${msg}`, 'danger');
+    }
+  });
+}
+
+// Poll a background sync until the server reports it finished
+function pollSyncStatus(taskId) {
+  $.ajax({
+    url: `/api/jobs/sync/status/${taskId}`,
+    method: 'GET',
+    success: (res) => {
+      if (res.state !== 'done') {
+        showStatus('Syncing jobs...', 'info');
+        setTimeout(() => pollSyncStatus(taskId), 3000);
+      } else if (res.success) {
         showStatus("Sync complete. Reloading...", "success");
         setTimeout(() => location.reload(), 3000);
       } else {